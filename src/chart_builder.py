@@ -0,0 +1,364 @@
+"""
+This module contains the ChartBuilder class, which is used to combine
+the steps and timing changes of a Pump It Up stepchart into columns of
+events with timestamps.
+"""
+
+import numpy as np
+from timing_map import TimingMap
+
+
+class ChartBuilder:
+    """
+    Build a tabular description of a stepchart from arrays of steps and
+    timing changes.
+
+    Each row of the result is a beat at which a step or timing change
+    occurs. The columns give the second at which the beat occurs, the
+    taps, hold caps, and remaining hold durations on each panel, and
+    the timing changes in effect. Every column is computed with NumPy
+    operations on sorted arrays, and the result is a dictionary of
+    arrays which can be turned into a data frame without copying.
+    """
+
+    tap, hold_cap, hold_tail = 0, 1, 2  # These index Stepchart.step_type_map.
+    timing_columns = [
+        "bpm",
+        "stop",
+        "delay",
+        "warp",
+        "tickcount",
+        "speed",
+        "speed_duration",
+        "speed_mode",
+        "scroll_factor",
+    ]
+    additive_columns = ["stop", "delay", "warp"]  # These may be absent.
+
+    def __init__(
+        self,
+        steps: np.ndarray,
+        timing_changes: dict[str, np.ndarray],
+        panels: str,
+        timing: TimingMap,
+    ):
+        """
+        Initialize a ChartBuilder object from parsed stepchart data.
+
+        Arguments
+        ---------
+        steps : np.ndarray
+            An array of steps with dtype Stepchart.step_dtype, as
+            produced by Stepchart.parse_steps_array.
+        timing_changes : dict[str, np.ndarray]
+            A dictionary whose keys are names of timing columns, such as
+            'bpm' or 'speed_mode', and whose values are 2D arrays
+            containing the beat and value of each change.
+        panels : str
+            The panels of the stepchart, in the order of panel_map.
+        timing : TimingMap
+            The TimingMap of the stepchart, which gives the offset of
+            the stepchart.
+        """
+        self.steps = steps
+        self.timing_changes = timing_changes
+        self.panels = panels
+        self.timing = timing
+
+    @staticmethod
+    def find_warps(
+        beats: np.ndarray, warp_starts: np.ndarray, warp_ends: np.ndarray
+    ) -> tuple:
+        """
+        Find the warps which skip over each of a number of beats.
+
+        A beat is skipped by a warp if it lies strictly between the
+        start and end of the warp. Warps may overlap. The warps are
+        sorted by start and a running maximum of their ends is taken,
+        so one binary search per beat finds the furthest end among the
+        warps starting before it. The latest start among the warps
+        skipping a beat is found by binary lifting over a table of
+        maximum ends of runs of warps.
+
+        Arguments
+        ---------
+        beats : np.ndarray
+            An array of beats.
+        warp_starts : np.ndarray
+            The beat at which each warp starts.
+        warp_ends : np.ndarray
+            The beat at which each warp ends.
+
+        Returns
+        -------
+        ends : np.ndarray
+            The latest end among the warps skipping each beat, or NaN
+            if the beat is not warped over.
+        starts : np.ndarray
+            The latest start among the warps skipping each beat, or NaN
+            if the beat is not warped over.
+        """
+        beats = np.asarray(beats, dtype=float)
+        ends = np.full(len(beats), np.nan)
+        starts = np.full(len(beats), np.nan)
+        if len(warp_starts) == 0 or len(beats) == 0:
+            return ends, starts
+
+        order = np.argsort(warp_starts, kind="stable")
+        warp_starts = np.asarray(warp_starts, dtype=float)[order]
+        warp_ends = np.asarray(warp_ends, dtype=float)[order]
+
+        # Count the warps starting before each beat and get the furthest
+        # end among them.
+        num_before = np.searchsorted(warp_starts, beats, side="left")
+        reach = np.maximum.accumulate(warp_ends)
+        furthest = reach[np.maximum(num_before - 1, 0)]
+        skipped = (num_before > 0) & (furthest > beats)
+        ends[skipped] = furthest[skipped]
+
+        # Build a table whose k-th row holds the maximum end of the 2**k
+        # warps ending at each position.
+        table = [warp_ends]
+        while 2 ** len(table) <= len(warp_ends):
+            prev, step = table[-1], 2 ** (len(table) - 1)
+            row = prev.copy()
+            row[step:] = np.maximum(prev[step:], prev[:-step])
+            table.append(row)
+
+        # For each skipped beat, walk back from the last warp starting
+        # before it over runs of warps which all end by the beat. The
+        # warp reached is the latest one skipping the beat.
+        x = beats[skipped]
+        pos = num_before[skipped] - 1
+        for k in reversed(range(len(table))):
+            step = 2**k
+            move = (pos - step + 1 >= 0) & (table[k][pos] <= x)
+            pos[move] -= step
+        starts[skipped] = warp_starts[pos]
+
+        return ends, starts
+
+    @staticmethod
+    def ffill(values: np.ndarray) -> np.ndarray:
+        """
+        Fill null values with the last non-null value above them.
+
+        Arguments
+        ---------
+        values : np.ndarray
+            A 1D or 2D array. Values are filled down each column.
+
+        Returns
+        -------
+        filled : np.ndarray
+            A copy of the array with null values filled.
+        """
+        rows = np.arange(len(values)).reshape((-1,) + (1,) * (values.ndim - 1))
+        last = np.where(np.isnan(values), 0, rows)
+        last = np.maximum.accumulate(last, axis=0)
+        return np.take_along_axis(values, last, axis=0)
+
+    @staticmethod
+    def cumsum(values: np.ndarray) -> np.ndarray:
+        """
+        Return the cumulative sum of an array, skipping null values.
+
+        As with pandas, null values are left null and do not interrupt
+        the sum.
+
+        Arguments
+        ---------
+        values : np.ndarray
+            A 1D array.
+
+        Returns
+        -------
+        sums : np.ndarray
+            The cumulative sums.
+        """
+        nulls = np.isnan(values)
+        sums = np.cumsum(np.where(nulls, 0, values))
+        sums[nulls] = np.nan
+        return sums
+
+    def get_timing_change(self, column: str) -> np.ndarray:
+        """
+        Return the timing changes of one column, sorted by beat.
+
+        If several changes occur at the same beat, stops, delays, and
+        warps are added together. Otherwise, the last change listed is
+        kept.
+
+        Arguments
+        ---------
+        column : str
+            The name of a timing column.
+
+        Returns
+        -------
+        changes : np.ndarray
+            A 2D array containing the beat and value of each change.
+        """
+        changes = self.timing_changes.get(column)
+        if changes is None or len(changes) == 0:
+            if column not in ChartBuilder.additive_columns:
+                raise KeyError(column)
+            return np.empty((0, 2))
+
+        changes = np.asarray(changes, dtype=float)
+        changes = changes[np.argsort(changes[:, 0], kind="stable")]
+        first = np.flatnonzero(np.append(True, np.diff(changes[:, 0]) != 0))
+        beats = changes[first, 0]
+        if column in ChartBuilder.additive_columns:
+            values = np.add.reduceat(changes[:, 1], first)
+        else:
+            values = changes[np.append(first[1:], len(changes)) - 1, 1]
+
+        return np.column_stack([beats, values])
+
+    def build(self) -> tuple[np.ndarray, dict[str, np.ndarray]]:
+        """
+        Combine the steps and timing changes into columns of events.
+
+        Holds warped over are cut at the warp, steps on top of warps
+        are ignored, rows warped over are dropped, and of any rows
+        sharing a timestamp only the first is kept.
+
+        Returns
+        -------
+        index : np.ndarray
+            The position of each row before rows sharing a timestamp
+            were dropped.
+        columns : dict[str, np.ndarray]
+            A dictionary mapping column names to arrays of values, in
+            the column order of chart_to_df.
+        """
+        steps = self.steps
+        num_panels = len(self.panels)
+        timing = {col: self.get_timing_change(col) for col in self.timing_columns}
+        warps = timing["warp"][timing["warp"][:, 1] > 0]
+        warp_starts = warps[:, 0]
+        warp_ends = warp_starts + warps[:, 1]
+
+        # Sort hold caps and tails by panel name, beat, and step type.
+        hold_types = [ChartBuilder.hold_cap, ChartBuilder.hold_tail]
+        holds = steps[np.isin(steps["step_type"], hold_types)]
+        panel_rank = np.argsort(np.argsort(np.array(list(self.panels))))
+        is_cap = holds["step_type"] == ChartBuilder.hold_cap
+        order = np.lexsort((~is_cap, holds["beat"], panel_rank[holds["panel"]]))
+        hold_beats = holds["beat"][order]
+        hold_panels = holds["panel"][order].astype(np.intp)
+        is_cap = is_cap[order]
+
+        # Move warped caps to the end of the warp and tails to its start.
+        ends, starts = ChartBuilder.find_warps(hold_beats, warp_starts, warp_ends)
+        fixed = np.where(is_cap, ends, starts)
+        fixed = np.where(np.isnan(fixed), hold_beats, fixed)
+
+        # Get hold durations. A cap lasts until the next hold step.
+        durations = np.append(np.abs(np.diff(fixed)), np.nan)[: len(fixed)]
+        durations[~is_cap] = 0
+
+        # Total the caps and durations on each panel at each beat. Hold
+        # durations are null at beats where the panel has no hold step.
+        grouped_beats, group = np.unique(fixed, return_inverse=True)
+        grouped_caps = np.zeros((len(grouped_beats), num_panels), dtype=np.int64)
+        np.add.at(grouped_caps, (group[is_cap], hold_panels[is_cap]), 1)
+        grouped_durations = np.zeros((len(grouped_beats), num_panels))
+        timed = ~np.isnan(durations)
+        np.add.at(
+            grouped_durations,
+            (group[timed], hold_panels[timed]),
+            durations[timed],
+        )
+        for panel in range(num_panels):
+            panel_beats = hold_beats[hold_panels == panel]
+            grouped_durations[~np.isin(grouped_beats, panel_beats), panel] = np.nan
+
+        # Count the taps on each panel at each beat.
+        taps = steps[steps["step_type"] == ChartBuilder.tap]
+        tap_beats, tap_group = np.unique(taps["beat"], return_inverse=True)
+        tap_counts = np.zeros((len(tap_beats), num_panels), dtype=np.int64)
+        np.add.at(tap_counts, (tap_group, taps["panel"].astype(np.intp)), 1)
+
+        # Create a row for each beat with a step or timing change.
+        change_beats = [changes[:, 0] for changes in timing.values()]
+        beats = np.unique(np.concatenate([tap_beats, grouped_beats, *change_beats]))
+        num_rows = len(beats)
+        tap_cols = np.full((num_rows, num_panels), np.nan)
+        tap_cols[np.searchsorted(beats, tap_beats)] = tap_counts
+        hold_rows = np.searchsorted(beats, grouped_beats)
+        hold_cols = np.full((num_rows, num_panels), np.nan)
+        hold_cols[hold_rows] = grouped_caps
+        duration_cols = np.full((num_rows, num_panels), np.nan)
+        duration_cols[hold_rows] = grouped_durations
+        columns = dict()
+        for col, changes in timing.items():
+            columns[col] = np.full(num_rows, np.nan)
+            columns[col][np.searchsorted(beats, changes[:, 0])] = changes[:, 1]
+
+        # Fill in hold durations between caps and tails.
+        row_beats = beats[:, None]
+        tail_beats = ChartBuilder.ffill(row_beats + duration_cols)
+        duration_cols = np.where(
+            np.isnan(duration_cols), tail_beats - row_beats, duration_cols
+        )
+        duration_cols[~(duration_cols >= 0)] = np.nan
+
+        # Ignore steps placed on top of warps.
+        on_warp = columns["warp"] > 0
+        tap_cols[on_warp] = 0
+        hold_cols[on_warp] = 0
+
+        # Drop rows which are warped over.
+        ends = ChartBuilder.find_warps(beats, warp_starts, warp_ends)[0]
+        kept = np.isnan(ends)
+        beats = beats[kept]
+        tap_cols = tap_cols[kept]
+        hold_cols = hold_cols[kept]
+        duration_cols = duration_cols[kept]
+        columns = {col: values[kept] for col, values in columns.items()}
+
+        # Forward fill the 'bpm' column and 0-fill other columns.
+        bpm = ChartBuilder.ffill(columns["bpm"])
+        for col in ["stop", "delay", "warp"]:
+            columns[col] = np.nan_to_num(columns[col], nan=0.0)
+
+        # Get row-to-row changes in beats and combine with stop, delay,
+        # and warp numbers to get elapsed seconds for each row. The sum
+        # runs over rows rather than the breakpoints of the TimingMap, so
+        # the seconds keep the rounding of earlier versions.
+        offset = self.timing.offset
+        warp_sum = np.concatenate([[0.0], np.cumsum(columns["warp"])[:-1]])
+        beats_corrected = beats - warp_sum
+        beat_delta = np.append(np.abs(np.diff(beats_corrected)), 0)[: len(beats)]
+        spb = 60 / bpm
+        time_shift = np.cumsum(columns["stop"] + columns["delay"])
+        time_shift -= offset
+        sec = ChartBuilder.cumsum(beat_delta * spb) + time_shift
+        sec = np.nan_to_num(np.concatenate([[0.0], sec[:-1]]), nan=0.0)
+        if len(sec):
+            sec[0] = -offset
+
+        # Forward fill the 'speed', 'scroll_factor', and 'tickcount'
+        # columns.
+        for col in ["speed", "scroll_factor", "tickcount"]:
+            columns[col] = ChartBuilder.ffill(columns[col])
+
+        # Order the columns.
+        chart = {"beat": beats, "sec": sec, "bpm": bpm}
+        for prefix, cols in [("tap", tap_cols), ("hold", hold_cols)]:
+            cols = np.nan_to_num(cols, nan=0.0).astype(np.int64)
+            for panel, name in enumerate(self.panels):
+                chart[f"{prefix}_{name}"] = cols[:, panel]
+        for panel, name in enumerate(self.panels):
+            chart[f"hold_duration_{name}"] = duration_cols[:, panel]
+        chart["tickcount"] = columns["tickcount"]
+        for col in self.timing_columns[1:4] + self.timing_columns[5:]:
+            chart[col] = columns[col]
+
+        # Delete duplicated timestamps.
+        index = np.sort(np.unique(sec, return_index=True)[1])
+        chart = {col: values[index] for col, values in chart.items()}
+
+        return index, chart
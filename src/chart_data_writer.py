@@ -0,0 +1,99 @@
+"""
+This module contains the ChartDataWriter class, which is used to write
+serialized stepcharts to a .csv file as they are produced.
+"""
+
+import csv, os
+
+
+class ChartDataWriter:
+    """
+    Stream rows of stepchart data to a .csv file.
+
+    Rows are buffered and written in batches, so memory use does not
+    depend on the number of stepcharts written. The output is the same
+    as that of writing a data frame of all rows with DataFrame.to_csv.
+
+    Rows are written to a temporary file, which replaces the .csv file
+    only when the writer is closed. If the writer is used as a context
+    manager and the block raises an exception, the temporary file is
+    removed and any previous .csv file is kept.
+    """
+
+    columns = ["Song Title", "Step Type", "Level", "Steps"]
+
+    def __init__(self, csv_path: str, batch_size: int = 64):
+        """
+        Initialize a ChartDataWriter object and write the header row.
+
+        Arguments
+        ---------
+        csv_path : str
+            A file path to the .csv file to be produced.
+        batch_size : int
+            The number of rows buffered before they are written and
+            flushed to disk.
+        """
+        self.csv_path = csv_path
+        self.temp_path = f"{csv_path}.tmp"
+        self.batch_size = batch_size
+        self.buffer = []
+        self.rows_written = 0
+
+        self.file = open(self.temp_path, "w", encoding="utf-8", newline="")
+        self.writer = csv.writer(self.file, lineterminator=os.linesep)
+        self.writer.writerow(self.columns)
+
+    def write(self, rows: list[list]) -> None:
+        """
+        Add rows of stepchart data to the .csv file.
+
+        Arguments
+        ---------
+        rows : list[list]
+            A list containing the song title, step type, level, and
+            serialized steps of each stepchart.
+        """
+        self.buffer.extend(rows)
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Write any buffered rows and flush them to disk.
+        """
+        self.writer.writerows(self.buffer)
+        self.rows_written += len(self.buffer)
+        self.buffer.clear()
+        self.file.flush()
+
+    def close(self) -> None:
+        """
+        Write any buffered rows and replace the .csv file with the rows
+        written.
+        """
+        if self.file.closed:
+            return
+        self.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        os.replace(self.temp_path, self.csv_path)
+
+    def discard(self) -> None:
+        """
+        Close the writer without replacing the .csv file, removing the
+        rows written.
+        """
+        if self.file.closed:
+            return
+        self.file.close()
+        os.remove(self.temp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        if exc_info[0] is None:
+            self.close()
+        else:
+            self.discard()
@@ -0,0 +1,213 @@
+"""
+This module contains the CorpusStore class, which is used to open a
+corpus of serialized stepcharts as memory-mapped arrays.
+"""
+
+import os
+from itertools import groupby
+import pandas as pd, numpy as np
+from corpus_writer import CorpusWriter
+from step_serializer import StepSerializer
+
+
+class CorpusStore:
+    """
+    Access a corpus of stepcharts written by the CorpusWriter class.
+
+    The events of all charts are opened with numpy.memmap, so opening a
+    corpus only reads its offsets and metadata, and the events of a
+    chart are read from disk when they are first accessed. Charts are
+    stored sorted by step type and level, so selecting the charts of a
+    step type or a range of levels returns a CorpusStore which shares
+    the events of the corpus without copying them.
+
+    Charts are identified by their position in the full corpus, which
+    is kept as the index of the metadata of every selection.
+    """
+
+    def __init__(self, corpus_path: str):
+        """
+        Initialize a CorpusStore object by opening a corpus directory.
+
+        Arguments
+        ---------
+        corpus_path : str
+            A path to a corpus directory.
+        """
+        self.corpus_path = corpus_path
+
+        # An empty file cannot be memory-mapped.
+        events_path = os.path.join(corpus_path, "events.bin")
+        if os.path.getsize(events_path) > 0:
+            self.events = np.memmap(
+                events_path, dtype=StepSerializer.event_dtype, mode="r"
+            )
+        else:
+            self.events = np.empty(0, dtype=StepSerializer.event_dtype)
+
+        offsets = np.load(os.path.join(corpus_path, "offsets.npy"), mmap_mode="r")
+        self.starts = offsets[:-1]
+        self.ends = offsets[1:]
+        self.metadata = pd.read_csv(
+            os.path.join(corpus_path, "metadata.csv"),
+            dtype={"Song Title": str, "Step Type": str, "Level": int, "Pack": str},
+            keep_default_na=False,
+        )
+
+    @classmethod
+    def from_csv(
+        cls, csv_path: str, corpus_path: str, chunksize: int = 1000
+    ) -> "CorpusStore":
+        """
+        Write the stepchart data of a CSV file produced by ssc_crawler
+        to a corpus and open it.
+
+        The CSV file is read in chunks, so it is never fully loaded
+        into memory. The pack of each chart is taken from a 'Pack'
+        column if the file has one and is left empty otherwise.
+
+        Arguments
+        ---------
+        csv_path : str
+            A path to a CSV file of stepchart data.
+        corpus_path : str
+            A path to the corpus directory to be produced.
+        chunksize : int
+            The number of rows read from the CSV file at a time.
+
+        Returns
+        -------
+        corpus : CorpusStore
+            The corpus containing the stepcharts of the CSV file.
+        """
+        columns = CorpusWriter.columns[:3] + ["Steps"]
+        with CorpusWriter(corpus_path) as writer:
+            for chunk in pd.read_csv(
+                csv_path, chunksize=chunksize, keep_default_na=False
+            ):
+                # Write runs of consecutive rows from the same pack.
+                rows = chunk[columns].values.tolist()
+                packs = chunk["Pack"] if "Pack" in chunk else [""] * len(chunk)
+                for pack, run in groupby(zip(packs, rows), key=lambda x: x[0]):
+                    writer.write([row for _, row in run], pack)
+
+        return cls(corpus_path)
+
+    @classmethod
+    def from_arrays(
+        cls,
+        events: np.ndarray,
+        starts: np.ndarray,
+        ends: np.ndarray,
+        metadata: pd.DataFrame,
+        corpus_path: str | None = None,
+    ) -> "CorpusStore":
+        """
+        Create a CorpusStore from arrays of events and offsets which are
+        already in memory, without copying them.
+
+        Arguments
+        ---------
+        events : np.ndarray
+            An array of events with dtype StepSerializer.event_dtype.
+        starts : np.ndarray
+            The index of the first event of each chart.
+        ends : np.ndarray
+            The index after the last event of each chart.
+        metadata : pd.DataFrame
+            The metadata of each chart, indexed by chart id.
+        corpus_path : str | None
+            A path to the corpus directory holding the events, or None
+            if they are not stored in a corpus directory.
+
+        Returns
+        -------
+        corpus : CorpusStore
+            A CorpusStore containing the charts.
+        """
+        corpus = object.__new__(cls)
+        corpus.corpus_path = corpus_path
+        corpus.events = events
+        corpus.starts = starts
+        corpus.ends = ends
+        corpus.metadata = metadata
+        return corpus
+
+    def __len__(self) -> int:
+        return len(self.metadata)
+
+    @property
+    def chart_ids(self) -> np.ndarray:
+        """
+        The ids of the charts in the store.
+        """
+        return self.metadata.index.values
+
+    def chart_events(self, i: int) -> np.ndarray:
+        """
+        Return the events of a chart in the store.
+
+        Arguments
+        ---------
+        i : int
+            The position of the chart in the store.
+
+        Returns
+        -------
+        events : np.ndarray
+            A view of the chart's events with dtype
+            StepSerializer.event_dtype.
+        """
+        return self.events[self.starts[i] : self.ends[i]]
+
+    def select(
+        self,
+        step_type: str | None = None,
+        min_level: int | None = None,
+        max_level: int | None = None,
+    ) -> "CorpusStore":
+        """
+        Select the charts of a step type and a range of levels.
+
+        The selection shares the events of the store. If the selected
+        charts are stored contiguously, which is always the case when a
+        step type is given, the offsets are shared as well.
+
+        Arguments
+        ---------
+        step_type : str | None
+            The step type of the selected charts, 'S' or 'D', or None to
+            select charts of both step types.
+        min_level : int | None
+            The minimum level of the selected charts, or None for no
+            minimum.
+        max_level : int | None
+            The maximum level of the selected charts, or None for no
+            maximum.
+
+        Returns
+        -------
+        selection : CorpusStore
+            A CorpusStore containing the selected charts.
+        """
+        selected = np.ones(len(self), dtype=bool)
+        if step_type is not None:
+            selected &= (self.metadata["Step Type"] == step_type).values
+        if min_level is not None:
+            selected &= (self.metadata["Level"] >= min_level).values
+        if max_level is not None:
+            selected &= (self.metadata["Level"] <= max_level).values
+        idx = np.flatnonzero(selected)
+
+        # Slice the offsets if the selected charts are contiguous.
+        if len(idx) == 0 or idx[-1] - idx[0] + 1 == len(idx):
+            start = idx[0] if len(idx) > 0 else 0
+            idx = slice(start, start + len(idx))
+
+        return CorpusStore.from_arrays(
+            self.events,
+            self.starts[idx],
+            self.ends[idx],
+            self.metadata.iloc[idx],
+            self.corpus_path,
+        )
@@ -0,0 +1,163 @@
+"""
+This module contains the CorpusWriter class, which is used to write
+serialized stepcharts to a memory-mapped corpus as they are produced.
+"""
+
+import os, shutil
+import pandas as pd, numpy as np
+from step_deserializer import StepDeserializer
+from step_serializer import StepSerializer
+
+
+class CorpusWriter:
+    """
+    Stream stepcharts to a corpus directory which can be opened with
+    the CorpusStore class.
+
+    The events of each stepchart are appended to a temporary file as
+    they arrive, so memory use does not depend on the size of the
+    corpus. When the writer is closed, the charts are sorted by step
+    type and level and the events are copied into their final order,
+    so that charts of a step type or level are stored contiguously.
+
+    The corpus is written to a temporary directory, which replaces the
+    corpus directory only when the writer is closed. If the writer is
+    used as a context manager and the block raises an exception, the
+    temporary directory is discarded and any previous corpus is kept.
+
+    A corpus directory contains three files: 'events.bin' holds the
+    events of all charts back to back, 'offsets.npy' holds the index of
+    the first event of each chart followed by the total number of
+    events, and 'metadata.csv' holds the song title, step type, level,
+    and pack of each chart.
+    """
+
+    columns = ["Song Title", "Step Type", "Level", "Pack"]
+
+    def __init__(self, corpus_path: str):
+        """
+        Initialize a CorpusWriter object and create a temporary
+        directory for the corpus.
+
+        Arguments
+        ---------
+        corpus_path : str
+            A path to the corpus directory to be produced.
+        """
+        self.corpus_path = corpus_path
+        self.deserializer = StepDeserializer()
+        self.metadata = []
+        self.lengths = []
+
+        # Remove any temporary directory left by an interrupted writer.
+        self.temp_dir = f"{corpus_path}.tmp"
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+        os.makedirs(self.temp_dir)
+        self.temp_path = os.path.join(self.temp_dir, "events.unsorted.bin")
+        self.file = open(self.temp_path, "wb")
+
+    def add(
+        self, song_title: str, step_type: str, level: int, pack: str, events: np.ndarray
+    ) -> None:
+        """
+        Add the events of a stepchart to the corpus.
+
+        Arguments
+        ---------
+        song_title : str
+            The title of the song.
+        step_type : str
+            Equal to 'S' if the chart is a singles chart or 'D' if the
+            chart is a doubles chart.
+        level : int
+            The level of the chart.
+        pack : str
+            The name of the pack containing the song.
+        events : np.ndarray
+            An array of events with dtype StepSerializer.event_dtype.
+        """
+        events = np.asarray(events, dtype=StepSerializer.event_dtype)
+        self.file.write(events.tobytes())
+        self.metadata.append([song_title, step_type, int(level), pack])
+        self.lengths.append(len(events))
+
+    def write(self, rows: list[list], pack: str = "") -> None:
+        """
+        Add rows of stepchart data to the corpus.
+
+        Arguments
+        ---------
+        rows : list[list]
+            A list containing the song title, step type, level, and
+            serialized steps of each stepchart.
+        pack : str
+            The name of the pack containing the stepcharts.
+        """
+        # Convert the steps of all rows in one pass.
+        events, offsets = self.deserializer.deserialize_column([row[3] for row in rows])
+        for (song_title, step_type, level, _), start, end in zip(
+            rows, offsets[:-1], offsets[1:]
+        ):
+            self.add(song_title, step_type, level, pack, events[start:end])
+
+    def close(self) -> None:
+        """
+        Sort the stepcharts, write the files of the corpus, and replace
+        the corpus directory with them.
+        """
+        if self.file.closed:
+            return
+        self.file.close()
+
+        # Sort the charts by step type and level, keeping the order in
+        # which charts were added within each group.
+        metadata = pd.DataFrame(self.metadata, columns=self.columns)
+        order = np.lexsort((metadata["Level"], metadata["Step Type"]))
+        lengths = np.array(self.lengths, dtype=np.int64)
+        starts = np.cumsum(lengths) - lengths
+
+        # Copy the events of each chart into their sorted position.
+        events_path = os.path.join(self.temp_dir, "events.bin")
+        with open(events_path, "wb") as f:
+            if lengths.sum() > 0:
+                events = np.memmap(
+                    self.temp_path, dtype=StepSerializer.event_dtype, mode="r"
+                )
+                for chart in order:
+                    start = starts[chart]
+                    f.write(events[start : start + lengths[chart]].tobytes())
+                del events
+        os.remove(self.temp_path)
+
+        offsets = np.concatenate([[0], np.cumsum(lengths[order])])
+        np.save(os.path.join(self.temp_dir, "offsets.npy"), offsets)
+        metadata = metadata.iloc[order].reset_index(drop=True)
+        metadata.to_csv(os.path.join(self.temp_dir, "metadata.csv"), index=False)
+
+        # A directory cannot replace a directory which is not empty, so
+        # the previous corpus is moved aside and removed afterwards.
+        old_dir = f"{self.corpus_path}.old"
+        shutil.rmtree(old_dir, ignore_errors=True)
+        if os.path.exists(self.corpus_path):
+            os.replace(self.corpus_path, old_dir)
+        os.replace(self.temp_dir, self.corpus_path)
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+    def discard(self) -> None:
+        """
+        Close the writer without writing the corpus, removing its
+        temporary directory.
+        """
+        if self.file.closed:
+            return
+        self.file.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        if exc_info[0] is None:
+            self.close()
+        else:
+            self.discard()
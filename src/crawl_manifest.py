@@ -0,0 +1,247 @@
+"""
+This module contains the CrawlManifest class, which records the .ssc
+files processed by a crawl so that later crawls can reuse their
+serialized stepcharts.
+"""
+
+import hashlib, json, os
+
+
+class CrawlManifest:
+    """
+    Record the serialized stepcharts produced from each .ssc file.
+
+    The manifest is a file of JSON lines. The first line is a header
+    giving the version of the parser and serializer which produced the
+    rows, and the records of a manifest with another version are all
+    stale. Each following line stores the path, size, modification
+    time, and content hash of an .ssc file together with the rows of
+    stepchart data produced from it, or the error raised if the file
+    could not be parsed. Lines are appended as soon as a file is
+    serialized, so a crawl which is interrupted can resume from the last
+    line written. If a path is recorded more than once, the last record
+    wins.
+
+    Only the fingerprints and the positions of the records are kept in
+    memory. The rows of a record are read from disk when requested.
+    """
+
+    version = 2  # This is increased whenever the rows of a file change.
+
+    def __init__(self, manifest_path: str):
+        """
+        Initialize a CrawlManifest object from a path to a manifest
+        file. The file will be created if it does not exist.
+
+        Arguments
+        ---------
+        manifest_path : str
+            A file path to the manifest.
+        """
+        self.manifest_path = manifest_path
+        self.records = dict()
+        self.load()
+
+    def load(self) -> None:
+        """
+        Read the fingerprints and positions of the records in the
+        manifest.
+
+        A record left incomplete by an interrupted crawl is discarded. A
+        manifest without a header or with a header of another version is
+        emptied, so every file will be serialized again.
+        """
+        self.records.clear()
+        header = self.header()
+        if not os.path.isfile(self.manifest_path):
+            with open(self.manifest_path, "wb") as f:
+                f.write(header)
+            return
+
+        with open(self.manifest_path, "rb") as f:
+            current = f.readline() == header
+        if not current:
+            with open(self.manifest_path, "wb") as f:
+                f.write(header)
+            return
+
+        end = len(header)
+        with open(self.manifest_path, "rb") as f:
+            f.seek(end)
+            for line in f:
+                # Stop at a partially written record.
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if not line.endswith(b"\n"):
+                    break
+
+                record.pop("rows")
+                record["offset"] = end
+                self.records[record["path"]] = record
+                end += len(line)
+
+        # Remove any partially written record so new records can be
+        # appended.
+        if os.path.getsize(self.manifest_path) > end:
+            with open(self.manifest_path, "r+b") as f:
+                f.truncate(end)
+
+    def header(self) -> bytes:
+        """
+        Return the header line of a manifest of the current version.
+
+        Returns
+        -------
+        header : bytes
+            The encoded header line, ending with a newline.
+        """
+        return (json.dumps({"version": self.version}) + "\n").encode("utf-8")
+
+    @staticmethod
+    def hash_file(ssc_path: str) -> str:
+        """
+        Return the SHA-1 hash of the contents of a file.
+
+        Arguments
+        ---------
+        ssc_path : str
+            A path to a file.
+
+        Returns
+        -------
+        digest : str
+            The hexadecimal digest of the file contents.
+        """
+        digest = hashlib.sha1()
+        with open(ssc_path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+
+        return digest.hexdigest()
+
+    def is_current(self, ssc_path: str) -> bool:
+        """
+        Check whether the manifest holds an up-to-date record of a file.
+
+        A record is up to date if the size and modification time of the
+        file are unchanged. If only the modification time has changed,
+        the content hash is compared instead, so files which were
+        touched but not edited are not serialized again. A record of a
+        file which could not be parsed is never up to date, so the file
+        is parsed again by every crawl.
+
+        Arguments
+        ---------
+        ssc_path : str
+            A path to an .ssc file.
+
+        Returns
+        -------
+        is_current : bool
+            True if the recorded rows can be reused, false otherwise.
+        """
+        record = self.records.get(os.path.abspath(ssc_path))
+        if record is None or record.get("error"):
+            return False
+
+        stat = os.stat(ssc_path)
+        if stat.st_size != record["size"]:
+            return False
+        if stat.st_mtime_ns != record["mtime"]:
+            if self.hash_file(ssc_path) != record["hash"]:
+                return False
+            record["mtime"] = stat.st_mtime_ns
+
+        return True
+
+    def rows(self, ssc_path: str) -> list[list]:
+        """
+        Return the rows recorded for a file.
+
+        Arguments
+        ---------
+        ssc_path : str
+            A path to an .ssc file with a record in the manifest.
+
+        Returns
+        -------
+        rows : list[list]
+            The song title, step type, level, and serialized steps of
+            each stepchart recorded for the file.
+        """
+        record = self.records[os.path.abspath(ssc_path)]
+        with open(self.manifest_path, "rb") as f:
+            f.seek(record["offset"])
+            rows = json.loads(f.readline())["rows"]
+
+        return rows
+
+    def record(self, ssc_path: str, rows: list[list], error: str = "") -> None:
+        """
+        Append a record of a file and the rows produced from it.
+
+        The manifest is flushed to disk after each record, so that the
+        record survives if the crawl is interrupted.
+
+        Arguments
+        ---------
+        ssc_path : str
+            A path to an .ssc file.
+        rows : list[list]
+            The rows of stepchart data produced from the file.
+        error : str
+            A description of the error raised while parsing the file,
+            or an empty string if it was parsed.
+        """
+        stat = os.stat(ssc_path)
+        record = {
+            "path": os.path.abspath(ssc_path),
+            "size": stat.st_size,
+            "mtime": stat.st_mtime_ns,
+            "hash": self.hash_file(ssc_path),
+            "error": error,
+        }
+        line = json.dumps({**record, "rows": rows}) + "\n"
+
+        with open(self.manifest_path, "ab") as f:
+            record["offset"] = f.tell()
+            f.write(line.encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+        self.records[record["path"]] = record
+
+    def compact(self, sscs: list[str]) -> None:
+        """
+        Rewrite the manifest so it holds one record per input file.
+
+        Records of files not in the input list, such as deleted files,
+        are dropped, as are records superseded by later ones. The
+        records are written in the order of the input list. The
+        manifest is replaced atomically, so an interruption leaves the
+        previous manifest intact.
+
+        Arguments
+        ---------
+        sscs : list[str]
+            A list of paths to .ssc files with records in the manifest.
+        """
+        temp_path = f"{self.manifest_path}.tmp"
+        records = dict()
+        with open(self.manifest_path, "rb") as src, open(temp_path, "wb") as dst:
+            dst.write(self.header())
+            for ssc in sscs:
+                record = self.records[os.path.abspath(ssc)]
+                src.seek(record["offset"])
+                line = json.loads(src.readline())
+                line["mtime"] = record["mtime"]
+
+                record = {**record, "offset": dst.tell()}
+                dst.write((json.dumps(line) + "\n").encode("utf-8"))
+                records[record["path"]] = record
+            dst.flush()
+            os.fsync(dst.fileno())
+
+        os.replace(temp_path, self.manifest_path)
+        self.records = records
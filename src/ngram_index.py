@@ -0,0 +1,445 @@
+"""
+This module contains the NGramIndex class, which can be used to find
+where step patterns may occur in a corpus without scanning every chart.
+"""
+
+import re
+import pandas as pd, numpy as np
+from corpus_store import CorpusStore
+from step_deserializer import StepDeserializer
+from step_serializer import StepSerializer
+from token_matcher import TokenMatcher
+
+
+class NGramIndex:
+    """
+    An inverted index from n-grams of rows of steps to the events at
+    which they occur.
+
+    Each distinct row of steps, together with whether its timestamp is
+    negative, is given an id. For every length from 1 to max_length,
+    the index stores each distinct sequence of consecutive ids within a
+    chart, or n-gram, together with a posting list of the events at
+    which it begins. Events are numbered consecutively across charts,
+    and each posting list is stored as its first event followed by the
+    differences between consecutive events, using the smallest integer
+    type which holds them.
+
+    A step pattern is looked up by checking each note against the
+    distinct rows of steps, selecting the n-grams whose rows all match,
+    and intersecting the posting lists of consecutive pieces of the
+    pattern. The matches found are those of the TokenMatcher class, so
+    only their speeds remain to be checked, and only the charts
+    containing a match need to be read.
+    """
+
+    key_bits = 40  # This is the number of bits used by the steps of a row.
+
+    def __init__(self, max_length: int = 3):
+        """
+        Initialize an empty NGramIndex object.
+
+        Arguments
+        ---------
+        max_length : int
+            The maximum number of consecutive rows in an n-gram. Longer
+            step patterns are looked up in pieces.
+        """
+        self.max_length = max_length
+        self.serializer = StepSerializer()
+        self.deserializer = StepDeserializer()
+        self.vocab = np.zeros(0, dtype=np.int64)
+        self.strings = np.zeros(0, dtype=object)
+        self.note_tables = dict()
+
+        # The indexed charts, which cover events bases[i] to
+        # bases[i] + lengths[i] - 1.
+        self.chart_ids = np.zeros(0, dtype=np.int64)
+        self.step_types = np.zeros(0, dtype="<U1")
+        self.bases = np.zeros(0, dtype=np.int64)
+        self.lengths = np.zeros(0, dtype=np.int64)
+        self.size = 0
+
+        # The n-grams and posting lists of each length.
+        lengths = range(1, max_length + 1)
+        self.grams = [np.zeros((0, n), dtype=np.uint8) for n in lengths]
+        self.indptr = [np.zeros(1, dtype=np.uint8) for _ in lengths]
+        self.firsts = [np.zeros(0, dtype=np.uint8) for _ in lengths]
+        self.deltas = [np.zeros(0, dtype=np.uint8) for _ in lengths]
+
+    def __len__(self) -> int:
+        return len(self.chart_ids)
+
+    def add(self, corpus: pd.DataFrame | CorpusStore) -> None:
+        """
+        Add the charts of a corpus to the index.
+
+        Arguments
+        ---------
+        corpus : pd.DataFrame | CorpusStore
+            A data frame with the 'Step Type' and 'Steps' columns of the
+            data produced by ssc_crawler, or a CorpusStore. The index of
+            the data frame, or the chart ids of the CorpusStore, must be
+            integers which are not already indexed.
+        """
+        if isinstance(corpus, CorpusStore):
+            chart_ids = corpus.chart_ids
+            step_types = corpus.metadata["Step Type"].values
+            starts = np.asarray(corpus.starts, dtype=np.int64)
+            ends = np.asarray(corpus.ends, dtype=np.int64)
+            positions, _ = StepDeserializer.segment_positions(starts, ends)
+            events = corpus.events[positions]
+            offsets = np.concatenate([[0], np.cumsum(ends - starts)])
+        else:
+            chart_ids = corpus.index.values
+            step_types = corpus["Step Type"].values
+            events, offsets = self.deserializer.deserialize_column(
+                corpus["Steps"].fillna("").tolist()
+            )
+
+        self.add_events(chart_ids, step_types, events, offsets)
+
+    def add_events(
+        self,
+        chart_ids: np.ndarray,
+        step_types: np.ndarray,
+        events: np.ndarray,
+        offsets: np.ndarray,
+    ) -> None:
+        """
+        Add charts given by their events to the index.
+
+        Arguments
+        ---------
+        chart_ids : np.ndarray
+            The integer id of each chart.
+        step_types : np.ndarray
+            The step type of each chart, 'S' or 'D'.
+        events : np.ndarray
+            An array with dtype StepSerializer.event_dtype containing the
+            events of all charts back to back.
+        offsets : np.ndarray
+            An array containing the index of the first event of each
+            chart followed by the total number of events.
+        """
+        chart_ids = np.asarray(chart_ids, dtype=np.int64)
+        indexed = np.concatenate([self.chart_ids, chart_ids])
+        if len(np.unique(indexed)) < len(indexed):
+            raise ValueError("Charts cannot be added to an index twice.")
+        offsets = np.asarray(offsets, dtype=np.int64)
+        lengths = np.diff(offsets)
+
+        # Give each row of steps an id, adding new rows to the vocabulary
+        # so that the ids of indexed rows do not change.
+        keys, inverse = np.unique(NGramIndex.event_keys(events), return_inverse=True)
+        new_keys = keys[~np.isin(keys, self.vocab)]
+        self.vocab = np.concatenate([self.vocab, new_keys])
+        sorter = np.argsort(self.vocab)
+        ids = sorter[np.searchsorted(self.vocab, keys, sorter=sorter)][inverse]
+
+        # Number the new events after those of the indexed charts.
+        chart_ends = np.repeat(offsets[1:], lengths)
+        base = self.size
+        self.chart_ids = indexed
+        self.step_types = np.concatenate([self.step_types, step_types]).astype("<U1")
+        self.bases = np.concatenate([self.bases, base + offsets[:-1]])
+        self.lengths = np.concatenate([self.lengths, lengths])
+        self.size += int(offsets[-1])
+
+        # Merge the n-grams of the new charts into the posting lists.
+        for n in range(1, self.max_length + 1):
+            num_windows = max(len(ids) - n + 1, 0)
+            starts = np.flatnonzero(
+                chart_ends[:num_windows] >= np.arange(num_windows) + n
+            )
+            grams = np.stack([ids[starts + i] for i in range(n)], axis=1)
+            old_grams, old_positions = self.postings(n)
+            self.build(
+                n,
+                np.concatenate([old_grams, grams]),
+                np.concatenate([old_positions, base + starts]),
+            )
+
+    def remove(self, chart_ids: np.ndarray) -> None:
+        """
+        Remove charts from the index.
+
+        Arguments
+        ---------
+        chart_ids : np.ndarray
+            The ids of the charts to be removed.
+        """
+        chart_ids = np.asarray(chart_ids, dtype=np.int64)
+        missing = chart_ids[~np.isin(chart_ids, self.chart_ids)]
+        if len(missing) > 0:
+            raise ValueError(f"Chart {missing[0]} is not in the index.")
+        removed = np.isin(self.chart_ids, chart_ids)
+
+        # Drop the events of the removed charts from the posting lists.
+        for n in range(1, self.max_length + 1):
+            grams, positions = self.postings(n)
+            charts = np.searchsorted(self.bases, positions, side="right") - 1
+            kept = ~removed[charts]
+            self.build(n, grams[kept], positions[kept])
+
+        self.chart_ids = self.chart_ids[~removed]
+        self.step_types = self.step_types[~removed]
+        self.bases = self.bases[~removed]
+        self.lengths = self.lengths[~removed]
+
+    def build(self, n: int, grams: np.ndarray, positions: np.ndarray) -> None:
+        """
+        Store the posting lists of the n-grams of a length.
+
+        Arguments
+        ---------
+        n : int
+            The length of the n-grams.
+        grams : np.ndarray
+            A 2D array of the row ids of the n-gram at each event.
+        positions : np.ndarray
+            The event at which each n-gram begins.
+        """
+        # Number each n-gram by its row ids, in base len(vocab).
+        radix = max(len(self.vocab), 1)
+        if radix**n >= 2**63:
+            raise ValueError(f"Too many distinct rows of steps to index {n}-grams.")
+        codes = grams.astype(np.int64) @ (radix ** np.arange(n, dtype=np.int64))
+
+        # Group the events of each n-gram in increasing order.
+        order = np.lexsort((positions, codes))
+        codes, positions = codes[order], positions[order]
+        first = np.ones(len(codes), dtype=bool)
+        first[1:] = codes[1:] != codes[:-1]
+        heads = np.flatnonzero(first)
+        deltas = np.diff(positions, prepend=0)
+        deltas[heads] = 0
+
+        # Store each array with the smallest integer type holding it.
+        arrays = [
+            grams[order[heads]],
+            np.append(heads, len(codes)),
+            positions[heads],
+            deltas,
+        ]
+        for stored, array in zip(
+            [self.grams, self.indptr, self.firsts, self.deltas], arrays
+        ):
+            dtype = np.min_scalar_type(array.max() if array.size > 0 else 0)
+            stored[n - 1] = array.astype(dtype)
+
+    def postings(
+        self, n: int, selected: np.ndarray | None = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Decode the posting lists of n-grams of a length.
+
+        Arguments
+        ---------
+        n : int
+            The length of the n-grams.
+        selected : np.ndarray | None
+            The positions of the n-grams to decode, or None to decode
+            every n-gram.
+
+        Returns
+        -------
+        grams : np.ndarray
+            A 2D array of the row ids of the n-gram of each event.
+        positions : np.ndarray
+            The events at which the n-grams begin, grouped by n-gram.
+        """
+        if selected is None:
+            selected = np.arange(len(self.grams[n - 1]))
+        indptr = self.indptr[n - 1].astype(np.int64)
+        starts, ends = indptr[selected], indptr[selected + 1]
+        idx, segments = StepDeserializer.segment_positions(starts, ends)
+
+        # Add up the differences from the first event of each list.
+        sums = np.cumsum(self.deltas[n - 1][idx], dtype=np.int64)
+        heads = np.cumsum(ends - starts) - (ends - starts)
+        positions = self.firsts[n - 1][selected].astype(np.int64)[segments] + sums
+        positions -= sums[heads[segments]]
+
+        return self.grams[n - 1][selected[segments]], positions
+
+    def note_table(self, note_pattern: str, last: bool, after_first: bool):
+        """
+        Check which rows of steps match a note of a step pattern.
+
+        Arguments
+        ---------
+        note_pattern : str
+            A regular expression for the step string of the note.
+        last : bool
+            If true, the note is the last of its pattern and only needs
+            to match the beginning of a step string.
+        after_first : bool
+            If true, the note is not the first of its pattern and cannot
+            fall on a negative timestamp.
+
+        Returns
+        -------
+        table : np.ndarray
+            A boolean array which is true for the ids of matching rows.
+        """
+        # Refresh the step strings when rows have been added.
+        if len(self.strings) < len(self.vocab):
+            mask = (1 << NGramIndex.key_bits) - 1
+            self.strings = self.serializer.key_strings("D", self.vocab & mask)
+            self.note_tables.clear()
+
+        key = (note_pattern, last)
+        if key not in self.note_tables:
+            regex = re.compile(note_pattern)
+            match = regex.match if last else regex.fullmatch
+            table = np.array([match(s) is not None for s in self.strings], dtype=bool)
+            self.note_tables[key] = table
+
+        table = self.note_tables[key]
+        if after_first:
+            table = table & ((self.vocab >> NGramIndex.key_bits) == 0)
+        return table
+
+    def match(
+        self, note_patterns: list[str], step_type: str, strict: bool = False
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Find the matches of a step pattern in the charts of a step type.
+
+        Arguments
+        ---------
+        note_patterns : list[str]
+            A regular expression for the step string of each note of
+            the pattern, as produced by
+            StepPatternSearcher.get_note_patterns.
+        step_type : str
+            Equal to 'S' to search singles charts or 'D' to search
+            doubles charts.
+        strict : bool
+            If true, every note must match its step string in full and
+            any note may fall on a negative timestamp, as in the runs
+            found by the RunDetector class.
+
+        Returns
+        -------
+        chart_ids : np.ndarray
+            The id of the chart of each match.
+        positions : np.ndarray
+            The index of the first event of each match within its
+            chart, in increasing order within each chart.
+        """
+        num_notes = len(note_patterns)
+        tables = [
+            self.note_table(
+                note_pattern, i == num_notes - 1 and not strict, i > 0 and not strict
+            )
+            for i, note_pattern in enumerate(note_patterns)
+        ]
+
+        # Intersect the events at which each piece of the pattern
+        # begins, shifted back to the beginning of the pattern.
+        starts = None
+        for offset in range(0, num_notes, self.max_length):
+            n = min(self.max_length, num_notes - offset)
+            grams = self.grams[n - 1]
+            matching = np.ones(len(grams), dtype=bool)
+            for i in range(n):
+                matching &= tables[offset + i][grams[:, i]]
+            _, positions = self.postings(n, np.flatnonzero(matching))
+            positions = np.sort(positions) - offset
+            if starts is None:
+                starts = positions
+            else:
+                starts = np.intersect1d(starts, positions, assume_unique=True)
+
+        # Keep the matches within a single chart of the step type.
+        charts = np.searchsorted(self.bases, starts, side="right") - 1
+        ends = self.bases[charts] + self.lengths[charts]
+        kept = (starts + num_notes <= ends) & (self.step_types[charts] == step_type)
+        starts = TokenMatcher.non_overlapping(starts[kept], num_notes)
+        charts = np.searchsorted(self.bases, starts, side="right") - 1
+
+        return self.chart_ids[charts], starts - self.bases[charts]
+
+    def save(self, path: str) -> None:
+        """
+        Save the index to a .npz file.
+
+        Arguments
+        ---------
+        path : str
+            A path to the file to be produced.
+        """
+        arrays = {
+            "max_length": self.max_length,
+            "size": self.size,
+            "vocab": self.vocab,
+            "chart_ids": self.chart_ids,
+            "step_types": self.step_types,
+            "bases": self.bases,
+            "lengths": self.lengths,
+        }
+        for n in range(1, self.max_length + 1):
+            arrays[f"grams_{n}"] = self.grams[n - 1]
+            arrays[f"indptr_{n}"] = self.indptr[n - 1]
+            arrays[f"firsts_{n}"] = self.firsts[n - 1]
+            arrays[f"deltas_{n}"] = self.deltas[n - 1]
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path: str) -> "NGramIndex":
+        """
+        Load an index saved with the save method.
+
+        Arguments
+        ---------
+        path : str
+            A path to a .npz file.
+
+        Returns
+        -------
+        index : NGramIndex
+            The loaded index.
+        """
+        with np.load(path) as arrays:
+            index = cls(int(arrays["max_length"]))
+            index.size = int(arrays["size"])
+            index.vocab = arrays["vocab"]
+            index.chart_ids = arrays["chart_ids"]
+            index.step_types = arrays["step_types"]
+            index.bases = arrays["bases"]
+            index.lengths = arrays["lengths"]
+            for n in range(1, index.max_length + 1):
+                index.grams[n - 1] = arrays[f"grams_{n}"]
+                index.indptr[n - 1] = arrays[f"indptr_{n}"]
+                index.firsts[n - 1] = arrays[f"firsts_{n}"]
+                index.deltas[n - 1] = arrays[f"deltas_{n}"]
+
+        return index
+
+    @staticmethod
+    def event_keys(events: np.ndarray) -> np.ndarray:
+        """
+        Get a key for the steps of each event and the sign of its
+        timestamp.
+
+        Arguments
+        ---------
+        events : np.ndarray
+            An array with dtype StepSerializer.event_dtype.
+
+        Returns
+        -------
+        keys : np.ndarray
+            The steps of each event as a key read by
+            StepSerializer.key_strings, with the bit above them set if
+            the timestamp is negative, including -0.0.
+        """
+        keys = (events["taps"] & 0x3FF).astype(np.int64)
+        for shift, field in enumerate(StepSerializer.event_dtype.names[2:], start=1):
+            keys |= events[field].astype(np.int64) << (10 * shift)
+        flagged = (events["taps"] & StepSerializer.negative_zero) > 0
+        negative = (events["ms"] < 0) | flagged
+
+        return keys | (negative.astype(np.int64) << NGramIndex.key_bits)
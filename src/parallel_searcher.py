@@ -0,0 +1,247 @@
+"""
+This module contains the ParallelSearcher class, which can be used to
+search a corpus of stepcharts for step patterns with a pool of worker
+processes.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import pandas as pd, numpy as np
+from corpus_store import CorpusStore
+from step_pattern_searcher import StepPatternSearcher
+from step_serializer import StepSerializer
+
+
+def search_shard(
+    memory_name: str,
+    num_events: int,
+    starts: np.ndarray,
+    ends: np.ndarray,
+    chart_ids: np.ndarray,
+    step_types: np.ndarray,
+    step_patterns: list[str],
+    options: dict,
+) -> pd.DataFrame:
+    """
+    Search a shard of a corpus whose events are held in shared memory.
+
+    Arguments
+    ---------
+    memory_name : str
+        The name of the shared memory block holding the events of the
+        corpus.
+    num_events : int
+        The number of events in the shared memory block.
+    starts : np.ndarray
+        The index of the first event of each chart of the shard.
+    ends : np.ndarray
+        The index after the last event of each chart of the shard.
+    chart_ids : np.ndarray
+        The id of each chart of the shard.
+    step_types : np.ndarray
+        The step type of each chart of the shard.
+    step_patterns : list[str]
+        The step patterns to search for.
+    options : dict
+        The keyword arguments passed to
+        StepPatternSearcher.search_corpus.
+
+    Returns
+    -------
+    matches : pd.DataFrame
+        The matches found in the shard, as returned by
+        StepPatternSearcher.search_corpus.
+    """
+    memory = shared_memory.SharedMemory(name=memory_name)
+    try:
+        # View the shard as a CorpusStore sharing the events in memory.
+        events = np.ndarray(
+            num_events, dtype=StepSerializer.event_dtype, buffer=memory.buf
+        )
+        metadata = pd.DataFrame({"Step Type": step_types}, index=chart_ids)
+        shard = CorpusStore.from_arrays(events, starts, ends, metadata)
+        matches = StepPatternSearcher().search_corpus(shard, step_patterns, **options)
+
+        # The block cannot be closed while the events are still viewed.
+        del shard, events
+        return matches
+    finally:
+        memory.close()
+
+
+class ParallelSearcher:
+    """
+    Search a corpus of stepcharts for step patterns across CPU cores.
+
+    The events of every chart are copied once into a block of shared
+    memory, which the worker processes attach to by name, so a task
+    only sends the bounds and ids of the charts of its shard. The
+    corpus is split into shards of consecutive charts holding about the
+    same number of events, each shard is searched with
+    StepPatternSearcher.search_corpus, and the matches of the shards
+    are joined in chart order, so the result is the same as searching
+    the whole corpus in one process.
+
+    The shared memory and the pool are kept until the searcher is
+    closed, so a ParallelSearcher should be used as a context manager
+    or closed explicitly.
+    """
+
+    def __init__(
+        self,
+        corpus: pd.DataFrame | CorpusStore,
+        workers: int | None = None,
+        num_shards: int | None = None,
+    ):
+        """
+        Initialize a ParallelSearcher object by copying the events of a
+        corpus into shared memory.
+
+        Arguments
+        ---------
+        corpus : pd.DataFrame | CorpusStore
+            A data frame with the 'Step Type' and 'Steps' columns of the
+            data produced by ssc_crawler, or a CorpusStore.
+        workers : int | None
+            The number of worker processes to use, or None to use one
+            per CPU.
+        num_shards : int | None
+            The number of shards to split the corpus into, or None to
+            use four per worker.
+        """
+        searcher = StepPatternSearcher()
+        self.chart_ids, self.step_types = searcher.corpus_charts(corpus)
+        events, self.offsets = searcher.chart_events(
+            corpus, np.arange(len(self.chart_ids))
+        )
+        self.workers = workers or os.cpu_count() or 1
+        self.num_shards = num_shards or 4 * self.workers
+
+        # An empty block of shared memory cannot be created.
+        self.num_events = len(events)
+        self.memory = shared_memory.SharedMemory(
+            create=True, size=max(events.nbytes, 1)
+        )
+        shared = np.ndarray(
+            self.num_events, dtype=StepSerializer.event_dtype, buffer=self.memory.buf
+        )
+        shared[:] = events
+        del shared
+
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+
+    def shards(self) -> list[tuple[int, int]]:
+        """
+        Split the charts of the corpus into shards of consecutive charts
+        with about the same number of events.
+
+        Returns
+        -------
+        shards : list[tuple[int, int]]
+            The position of the first chart of each shard and the
+            position after its last chart.
+        """
+        targets = np.linspace(0, self.num_events, self.num_shards + 1)
+        bounds = np.searchsorted(self.offsets[:-1], targets[1:-1])
+        bounds = np.unique(np.concatenate([[0], bounds, [len(self.chart_ids)]]))
+        return list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+
+    def search(
+        self,
+        step_patterns: str | list[str],
+        min_dt: float = 0.0,
+        max_dt: float = 1.0,
+        tol: float = 0.01,
+        hold_distinctions: bool = False,
+        repeat: bool = False,
+        backend: str = "regex",
+        symmetric: bool = False,
+    ) -> pd.DataFrame:
+        """
+        Search every chart of the corpus for step patterns within a
+        speed range.
+
+        Arguments
+        ---------
+        step_patterns : str | list[str]
+            A step pattern or a list of step patterns to search for.
+        min_dt : float
+            The minimum time differential between steps in the pattern.
+        max_dt : float
+            The maximum time differential between steps in the pattern.
+        tol : float
+            A tolerance parameter controlling how close the time
+            differentials between steps need to be to the input range.
+        hold_distinctions : bool
+            If true, the caps/tails/interiors of holds will be
+            distinguished for searching.
+        repeat : bool
+            If true, the searcher will look for maximal runs of
+            back-to-back repetitions of each pattern.
+        backend : str
+            The search engine to use, 'regex', 'token', or 'automaton'.
+        symmetric : bool
+            If true, the searcher will look for the images of each
+            pattern under every symmetry of the pad.
+
+        Returns
+        -------
+        matches : pd.DataFrame
+            The matches found in the corpus, as returned by
+            StepPatternSearcher.search_corpus for the whole corpus.
+        """
+        if backend not in ["regex", "token", "automaton"]:
+            raise ValueError(f"Unknown search backend {backend}.")
+        if isinstance(step_patterns, str):
+            step_patterns = [step_patterns]
+        step_patterns = list(dict.fromkeys(step_patterns))
+        options = {
+            "min_dt": min_dt,
+            "max_dt": max_dt,
+            "tol": tol,
+            "hold_distinctions": hold_distinctions,
+            "repeat": repeat,
+            "backend": backend,
+            "symmetric": symmetric,
+        }
+
+        # Submit every shard, then collect the results in chart order.
+        futures = [
+            self.pool.submit(
+                search_shard,
+                self.memory.name,
+                self.num_events,
+                self.offsets[first:last],
+                self.offsets[first + 1 : last + 1],
+                self.chart_ids[first:last],
+                self.step_types[first:last],
+                step_patterns,
+                options,
+            )
+            for first, last in self.shards()
+        ]
+        results = [future.result() for future in futures]
+        if len(results) == 0:
+            return StepPatternSearcher().search_corpus(
+                pd.DataFrame({"Step Type": [], "Steps": []}), step_patterns, **options
+            )
+
+        return pd.concat(results, ignore_index=True)
+
+    def close(self) -> None:
+        """
+        Shut down the worker processes and free the shared memory.
+        """
+        if self.pool is None:
+            return
+        self.pool.shutdown(cancel_futures=True)
+        self.pool = None
+        self.memory.close()
+        self.memory.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,181 @@
+"""
+This module contains the PatternAutomaton class, which can be used to
+find many step patterns in arrays of step events in a single pass.
+"""
+
+import numpy as np
+from token_matcher import TokenMatcher
+
+
+class PatternAutomaton(TokenMatcher):
+    """
+    Find many step patterns at once in the events of stepcharts.
+
+    The notes of all patterns are compiled into one automaton, in the
+    spirit of the Aho-Corasick algorithm. Tokens are first grouped into
+    classes which match the same notes, so the alphabet of the
+    automaton is small. A state of the automaton is the set of pattern
+    prefixes ending at the current token, stored as a bitmask with one
+    bit per note as in the Shift-And algorithm, and the transitions
+    between the states which actually occur are computed when they are
+    first needed and kept in a table.
+
+    Each chart is read once, token by token, with all charts advancing
+    together, so the cost grows with the length of the charts rather
+    than with the number of patterns. Matches are those of the
+    TokenMatcher class for each pattern separately.
+    """
+
+    def __init__(self, events: np.ndarray, offsets: np.ndarray):
+        """
+        Initialize a PatternAutomaton object for the events of
+        stepcharts.
+
+        Arguments
+        ---------
+        events : np.ndarray
+            An array with dtype StepSerializer.event_dtype containing the
+            events of all stepcharts back to back.
+        offsets : np.ndarray
+            An array containing the index of the first event of each
+            stepchart followed by the total number of events.
+        """
+        super().__init__(events, offsets)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+
+    def compile(
+        self, pattern_list: list[list[str]]
+    ) -> tuple[np.ndarray, list[int], int, int]:
+        """
+        Compile the notes of step patterns into the transitions of an
+        automaton.
+
+        Arguments
+        ---------
+        pattern_list : list[list[str]]
+            A list of the regular expressions for the notes of each step
+            pattern, as produced by
+            StepPatternSearcher.get_note_patterns.
+
+        Returns
+        -------
+        classes : np.ndarray
+            The class of each token.
+        class_masks : list[int]
+            For each class, the bitmask of the notes matched by its
+            tokens.
+        first_bits : int
+            The bitmask of the first note of each pattern.
+        last_bits : int
+            The bitmask of the last note of each pattern.
+        """
+        # A symbol is a distinct step string together with the sign of
+        # the timestamp, and notes after the first never match a
+        # negative timestamp.
+        columns = []
+        for note_patterns in pattern_list:
+            for i, note_pattern in enumerate(note_patterns):
+                table = self.note_table(note_pattern, i == len(note_patterns) - 1)
+                columns.append(np.stack([table, table & (i == 0)], axis=1).ravel())
+        symbols = 2 * self.inverse + self.negative
+        signatures = np.stack(columns, axis=1)
+
+        # Symbols matching the same notes belong to the same class. The
+        # notes matched by a symbol are packed into bytes to compare them.
+        packed = np.packbits(signatures, axis=1, bitorder="little")
+        rows = np.ascontiguousarray(packed).view(f"V{packed.shape[1]}").ravel()
+        rows, symbol_classes = np.unique(rows, return_inverse=True)
+        class_masks = [int.from_bytes(row.tobytes(), "little") for row in rows]
+
+        lengths = np.array([len(note_patterns) for note_patterns in pattern_list])
+        ends = np.cumsum(lengths)
+        first_bits = sum(1 << int(bit) for bit in ends - lengths)
+        last_bits = sum(1 << int(bit) for bit in ends - 1)
+
+        return symbol_classes[symbols], class_masks, first_bits, last_bits
+
+    def match_all(self, pattern_list: list[list[str]]) -> list[np.ndarray]:
+        """
+        Find the matches of many step patterns.
+
+        Arguments
+        ---------
+        pattern_list : list[list[str]]
+            A list of the regular expressions for the notes of each step
+            pattern, as produced by
+            StepPatternSearcher.get_note_patterns.
+
+        Returns
+        -------
+        starts_list : list[np.ndarray]
+            For each pattern, the index of the first token of each match
+            in increasing order, as found by TokenMatcher.match.
+        """
+        if len(pattern_list) == 0:
+            return []
+        classes, class_masks, first_bits, last_bits = self.compile(pattern_list)
+        lengths = np.array([len(note_patterns) for note_patterns in pattern_list])
+        last_notes = (np.cumsum(lengths) - 1).tolist()
+
+        # State 0 is the empty set of prefixes, which begins each chart.
+        # The transitions and accepted patterns of each state are filled
+        # in as states are reached.
+        masks = [0]
+        states = {0: 0}
+        table = np.full((16, len(class_masks)), -1, dtype=np.int64)
+        accepts = np.zeros((16, len(pattern_list)), dtype=bool)
+
+        # Advance the charts together, longest first, so that the charts
+        # which have not ended are always a prefix.
+        chart_lengths = np.diff(self.offsets)
+        order = np.argsort(-chart_lengths, kind="stable")
+        chart_starts = self.offsets[:-1][order]
+        max_length = chart_lengths.max() if len(order) > 0 else 0
+        num_active = np.searchsorted(-chart_lengths[order], -np.arange(max_length))
+        current = np.zeros(len(order), dtype=np.int64)
+        hit_tokens, hit_states = [], []
+        for j in range(max_length):
+            tokens = chart_starts[: num_active[j]] + j
+            token_classes = classes[tokens]
+            previous = current[: num_active[j]]
+            following = table[previous, token_classes]
+
+            # Add the transitions which have not been needed before.
+            missing = following < 0
+            for state, token_class in set(
+                zip(previous[missing].tolist(), token_classes[missing].tolist())
+            ):
+                mask = masks[state] << 1 & ~first_bits | first_bits
+                mask &= class_masks[token_class]
+                if mask not in states:
+                    states[mask] = len(masks)
+                    masks.append(mask)
+                    if len(masks) > len(table):
+                        table = np.concatenate([table, np.full_like(table, -1)])
+                        accepts = np.concatenate([accepts, np.zeros_like(accepts)])
+                    if mask & last_bits:
+                        accepts[states[mask]] = [
+                            mask >> bit & 1 == 1 for bit in last_notes
+                        ]
+                table[state, token_class] = states[mask]
+            if missing.any():
+                following = table[previous, token_classes]
+            current[: num_active[j]] = following
+
+            # Keep the tokens at which a pattern ends.
+            accepted = accepts[following].any(axis=1)
+            if accepted.any():
+                hit_tokens.append(tokens[accepted])
+                hit_states.append(following[accepted])
+
+        # Resolve overlapping matches of each pattern from left to right.
+        hit_tokens = np.concatenate([np.zeros(0, dtype=np.int64)] + hit_tokens)
+        hit_states = np.concatenate([np.zeros(0, dtype=np.int64)] + hit_states)
+        hits, patterns = np.nonzero(accepts[hit_states])
+        starts = hit_tokens[hits] - lengths[patterns] + 1
+        starts_list = []
+        for i, length in enumerate(lengths):
+            pattern_starts = np.sort(starts[patterns == i])
+            starts_list.append(TokenMatcher.non_overlapping(pattern_starts, length))
+
+        return starts_list
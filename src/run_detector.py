@@ -0,0 +1,179 @@
+"""
+This module contains the RunDetector class, which can be used to find
+runs of a repeated step pattern in arrays of step events.
+"""
+
+import numpy as np
+from token_matcher import TokenMatcher
+
+
+class RunDetector(TokenMatcher):
+    """
+    Find maximal runs of back-to-back repetitions of a step pattern.
+
+    A run is a sequence of consecutive tokens formed by repeating a
+    step pattern one or more times, in which the time differential
+    between consecutive notes stays within the speed range and changes
+    by no more than the tolerance from one note to the next. Every note
+    of a run must match its step string in full, and timestamps are
+    read with their sign.
+
+    Runs are found in a fixed number of passes over the tokens: each
+    token is checked for the start of a repetition, then for a link to
+    the next repetition, and the number of consecutive links following
+    each token is counted along every alignment of the pattern at once.
+    Runs are then selected from left to right, skipping any run which
+    overlaps a selected run, so a selected run cannot be extended.
+    """
+
+    def __init__(self, events: np.ndarray, offsets: np.ndarray):
+        """
+        Initialize a RunDetector object for the events of stepcharts.
+
+        Arguments
+        ---------
+        events : np.ndarray
+            An array with dtype StepSerializer.event_dtype containing the
+            events of all stepcharts back to back.
+        offsets : np.ndarray
+            An array containing the index of the first event of each
+            stepchart followed by the total number of events.
+        """
+        super().__init__(events, offsets)
+        self.times = events["ms"] / 1000
+
+    def runs(
+        self,
+        note_patterns: list[str],
+        min_dt: float = 0.0,
+        max_dt: float = 1.0,
+        tol: float = 0.01,
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Find the maximal runs of a step pattern.
+
+        Arguments
+        ---------
+        note_patterns : list[str]
+            A regular expression for the step string of each note of
+            the pattern, as produced by
+            StepPatternSearcher.get_note_patterns.
+        min_dt : float
+            The minimum time differential between steps in a run.
+        max_dt : float
+            The maximum time differential between steps in a run.
+        tol : float
+            A tolerance parameter controlling how close the time
+            differentials between steps need to be to the input range
+            and to each other.
+
+        Returns
+        -------
+        starts : np.ndarray
+            The index of the first token of each run, in increasing
+            order.
+        repetitions : np.ndarray
+            The number of repetitions of the pattern in each run.
+        dts : np.ndarray
+            The mean time differential between consecutive notes of each
+            run, or 0 for a run of a single note.
+        """
+        k = len(note_patterns)
+        n = len(self.inverse)
+        if n == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+        positions = np.arange(n)
+
+        # Check each pair of consecutive notes of a chart against the
+        # speed range, and each pair of consecutive time differentials
+        # against the tolerance. Flags are padded with false past the
+        # last token so they can be read at any offset up to 2k.
+        dts = np.diff(self.times)
+        in_range = np.zeros(n + 2 * k + 1, dtype=bool)
+        in_range[: n - 1] = (
+            (self.chart_ends[:-1] > positions[:-1] + 1)
+            & (dts >= min_dt - tol)
+            & (dts <= max_dt + tol)
+        )
+        steady = np.zeros(n + 2 * k + 1, dtype=bool)
+        steady[1 : n - 1] = np.abs(np.diff(dts)) <= tol
+
+        # A repetition may start at a token if its notes match and its
+        # own time differentials satisfy the speed constraints.
+        starts = self.chart_ends >= positions + k
+        for i, note_pattern in enumerate(note_patterns):
+            starts[: n - i] &= self.note_matches(note_pattern, False)[i:]
+        starts &= RunDetector.all_true(in_range, n, 0, k - 2)
+        starts &= RunDetector.all_true(steady, n, 1, k - 2)
+
+        # A repetition links to the next if the time differential between
+        # them keeps the speed. The links after the first of a run must
+        # also keep the speed of the link before them, which is only
+        # outside the repetitions when the pattern has a single note.
+        following = np.zeros(n + k, dtype=bool)
+        following[:n] = starts
+        links = starts & following[k:] & in_range[k - 1 : n + k - 1]
+        if k > 1:
+            links &= steady[k - 1 : n + k - 1] & steady[k : n + k]
+            continued = links
+        else:
+            continued = links & steady[:n]
+
+        # Count the consecutive continued links from each token along its
+        # alignment of the pattern.
+        padded = np.zeros(-(-n // k) * k + k, dtype=bool)
+        padded[:n] = continued
+        grid = padded.reshape(-1, k)
+        rows = np.arange(len(grid))[:, None]
+        breaks = np.where(grid, len(grid), rows)
+        next_break = np.minimum.accumulate(breaks[::-1], axis=0)[::-1]
+        counts = (next_break - rows).ravel()
+
+        # Each start begins a run extending over every link which follows.
+        run_starts = np.flatnonzero(starts)
+        repetitions = np.ones(len(run_starts), dtype=np.int64)
+        linked = links[run_starts]
+        repetitions[linked] = 2 + counts[run_starts[linked] + k]
+        lengths = repetitions * k
+
+        selected = np.isin(
+            run_starts, TokenMatcher.non_overlapping(run_starts, lengths)
+        )
+        run_starts, repetitions = run_starts[selected], repetitions[selected]
+        lengths = lengths[selected]
+        spans = self.times[run_starts + lengths - 1] - self.times[run_starts]
+        run_dts = np.where(lengths > 1, spans / np.maximum(lengths - 1, 1), 0.0)
+
+        return run_starts, repetitions, run_dts
+
+    @staticmethod
+    def all_true(flags: np.ndarray, n: int, first: int, last: int) -> np.ndarray:
+        """
+        Check, for each token, whether all flags in a range of offsets
+        from it are true.
+
+        Arguments
+        ---------
+        flags : np.ndarray
+            A boolean array padded with false past the last token, with
+            at least n + last + 1 entries.
+        n : int
+            The number of tokens.
+        first : int
+            The first offset to check.
+        last : int
+            The last offset to check. If less than first, no flags are
+            checked.
+
+        Returns
+        -------
+        checks : np.ndarray
+            A boolean array which is true for tokens whose flags in the
+            range are all true.
+        """
+        if last < first:
+            return np.ones(n, dtype=bool)
+
+        failures = np.concatenate([[0], np.cumsum(~flags)])
+        positions = np.arange(n)
+        return failures[positions + last + 1] == failures[positions + first]
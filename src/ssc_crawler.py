@@ -4,19 +4,29 @@ stepcharts in the .ssc files.
 
 To use this script, run it from the command line. You will be prompted
 to enter the path to your ssc directory, the names of the pack folders
-you wish to crawl through, and the name of the .csv file you wish to
-output. The script will then parse the .ssc files within the input pack
-folders and parse any Pump It Up single or double stepcharts found.
-Nonstandard charts, such as unofficial charts or quest charts, will be
-ignored. The steps of each chart will be serialized, and the script
-will save a .csv file in the data subfolder of the NLPump directory.
-The rows of the .csv file correspond to stepcharts, and the columns
-give the song title, step type (single or double), level, and the
-serialized steps.
+you wish to crawl through, the name of the .csv file you wish to output,
+and the number of worker processes to use. The script will then parse
+the .ssc files within the input pack folders and parse any Pump It Up
+single or double stepcharts found. Nonstandard charts, such as
+unofficial charts or quest charts, will be ignored. The steps of each
+chart will be serialized, and the script will save a .csv file in the
+data subfolder of the NLPump directory. The rows of the .csv file
+correspond to stepcharts, and the columns give the song title, step type
+(single or double), level, and the serialized steps. The same stepcharts
+are also saved as a corpus directory, which can be opened with the
+CorpusStore class, together with an index of its step n-grams, which can
+be loaded with the NGramIndex class.
 """
 
 import os, re
-import pandas as pd
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterator
+from chart_data_writer import ChartDataWriter
+from corpus_store import CorpusStore
+from corpus_writer import CorpusWriter
+from crawl_manifest import CrawlManifest
+from ngram_index import NGramIndex
 from ssc_parser import SSCFile
 from stepchart_parser import Stepchart
 from step_serializer import StepSerializer
@@ -145,6 +155,198 @@ def crawl(folder: str, valid_packs: list = [], verbose: bool = True) -> list[str
     return all_sscs
 
 
+def serialize_ssc(ssc_path: str) -> list[list]:
+    """
+    Parse an .ssc file and serialize its standard stepcharts.
+
+    Arguments
+    ---------
+    ssc_path : str
+        The path to an .ssc file.
+
+    Returns
+    -------
+    chart_data : list[list]
+        A list containing the song title, step type, level, and
+        serialized steps of each standard stepchart in the file.
+    """
+    serializer = StepSerializer()
+    ssc = SSCFile(ssc_path, verbose=False, lazy=True)
+    song_title = ssc.global_attributes["TITLE"]
+
+    # Parse the standard stepcharts and serialize their steps together.
+    charts = [Stepchart(song_title, chart) for chart in ssc.stepcharts]
+    charts = [chart for chart in charts if chart.standard]
+    columns = [chart.build_chart()[1] for chart in charts]
+    steps = serializer.serialize_charts(columns)
+    chart_data = [
+        [song_title, chart.step_type, chart.level, chart_steps]
+        for chart, chart_steps in zip(charts, steps)
+    ]
+
+    return chart_data
+
+
+def serialize_task(ssc_path: str) -> tuple[list[list], str]:
+    """
+    Serialize an .ssc file, capturing any error raised while doing so.
+
+    This wraps serialize_ssc so that a single broken file does not
+    abort a crawl, and in particular does not break a process pool.
+
+    Arguments
+    ---------
+    ssc_path : str
+        The path to an .ssc file.
+
+    Returns
+    -------
+    chart_data : list[list]
+        The serialized stepcharts, or an empty list if parsing failed.
+    error : str
+        A description of the error raised, or an empty string.
+    """
+    try:
+        return serialize_ssc(ssc_path), ""
+    except Exception as e:
+        return [], f"{type(e).__name__}: {e}"
+
+
+def bounded_map(
+    pool: ProcessPoolExecutor, func: Callable, items: list, window: int
+) -> Iterator:
+    """
+    Map a function over a list of items using a process pool.
+
+    Unlike Executor.map, at most a fixed number of tasks are submitted
+    ahead of the result being consumed, so completed results do not
+    accumulate in memory when the consumer falls behind.
+
+    Arguments
+    ---------
+    pool : ProcessPoolExecutor
+        The pool to submit tasks to.
+    func : Callable
+        The function to apply to each item.
+    items : list
+        The items to apply the function to.
+    window : int
+        The maximum number of tasks in flight at any time.
+
+    Returns
+    -------
+    results : Iterator
+        Yields the result for each item, in the order of the items.
+    """
+    pending = deque()
+    for item in items:
+        pending.append(pool.submit(func, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def serialize_sscs(
+    sscs: list[str], workers: int = 1, verbose: bool = True
+) -> Iterator[tuple[str, list[list], str]]:
+    """
+    Serialize the stepcharts in a list of .ssc files.
+
+    Each .ssc file is one task. If more than one worker is requested,
+    the tasks are spread over a pool of worker processes. Results are
+    always yielded in the order of the input files, so the output of a
+    parallel crawl matches that of a serial crawl row for row. Files
+    which fail to parse are reported and skipped.
+
+    Arguments
+    ---------
+    sscs : list[str]
+        A list of paths to .ssc files.
+    workers : int
+        The number of worker processes to use. If 1, the files are
+        serialized in the current process.
+    verbose : bool
+        If true, the function will print a line for each serialized
+        stepchart and each skipped file.
+
+    Returns
+    -------
+    results : Iterator[tuple[str, list[list], str]]
+        Yields the path to each .ssc file together with its serialized
+        stepcharts and a description of the error raised while parsing
+        it, or an empty string.
+    """
+    if workers > 1:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        results = bounded_map(pool, serialize_task, sscs, 2 * workers)
+    else:
+        pool = None
+        results = map(serialize_task, sscs)
+
+    try:
+        for ssc, (chart_data, error) in zip(sscs, results):
+            if verbose:
+                if error:
+                    print(f"Skipped {ssc}: {error}")
+                for song_title, step_type, level, _ in chart_data:
+                    print(f"Serialized {song_title} {step_type}{level}.")
+                print()
+            yield ssc, chart_data, error
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+
+def update_sscs(
+    sscs: list[str], manifest: CrawlManifest, workers: int = 1, verbose: bool = True
+) -> Iterator[tuple[str, list[list]]]:
+    """
+    Serialize the stepcharts in a list of .ssc files, reusing the rows
+    recorded in a manifest for files which have not changed.
+
+    Added and changed files are serialized as in serialize_sscs and
+    recorded in the manifest as soon as their rows are available, so
+    an interrupted crawl can be resumed from the last recorded file.
+    Files which fail to parse are recorded with their error, so they
+    are retried by the next crawl.
+
+    Arguments
+    ---------
+    sscs : list[str]
+        A list of paths to .ssc files.
+    manifest : CrawlManifest
+        The manifest of a previous crawl.
+    workers : int
+        The number of worker processes to use.
+    verbose : bool
+        If true, the function will print status updates such as the
+        number of .ssc files which need to be serialized.
+
+    Returns
+    -------
+    results : Iterator[tuple[str, list[list]]]
+        Yields the path to each .ssc file together with its serialized
+        stepcharts, in the order of the input files.
+    """
+    stale = [ssc for ssc in sscs if not manifest.is_current(ssc)]
+    if verbose:
+        print(f"Reusing {len(sscs) - len(stale)} of {len(sscs)} .ssc files.")
+        print()
+
+    # Serialize the new and changed files. These are a subsequence of
+    # the input files, so both can be consumed in order.
+    serialized = serialize_sscs(stale, workers=workers, verbose=verbose)
+    stale = set(stale)
+    for ssc in sscs:
+        if ssc in stale:
+            _, chart_data, error = next(serialized)
+            manifest.record(ssc, chart_data, error)
+        else:
+            chart_data = manifest.rows(ssc)
+        yield ssc, chart_data
+
+
 if __name__ == "__main__":
     # Prompt the user to enter their .ssc directory.
     ssc_directory = str(input("Enter the path to your SSC directory: "))
@@ -174,30 +376,42 @@ if __name__ == "__main__":
     file_name = str(input(prompt))
     data_folder = os.path.join(os.path.dirname(os.getcwd()), "data")
     csv_path = os.path.join(data_folder, f"{file_name}.csv")
+    corpus_path = os.path.join(data_folder, f"{file_name}.corpus")
     print()
 
-    # Crawl through the .ssc directory and serialize steps.
-    serializer = StepSerializer()
-    sscs = crawl(ssc_directory, valid_packs=packs)
-    all_chart_data = []
-    for ssc in sscs:
-        ssc = SSCFile(ssc)
-        song_title = ssc.global_attributes["TITLE"]
-        for chart in ssc.stepcharts:
-            # Parse the stepchart and serialize steps.
-            chart = Stepchart(song_title, chart)
-            if chart.standard:
-                step_type = chart.step_type
-                level = chart.level
-                df = chart.chart_to_df()
-                steps = serializer.serialize_steps(step_type, df)
-                data = [song_title, step_type, level, steps]
-                all_chart_data.append(data)
-                print(f"Serialized {song_title} {step_type}{level}.")
+    # Prompt the user to enter the number of worker processes until a
+    # number is entered, and keep it between 1 and the number of CPUs.
+    max_workers = os.cpu_count() or 1
+    prompt = f"""
+        Enter the number of worker processes to use (up to {max_workers}).
+        If you wish to crawl serially, enter a null argument: 
+    """
+    prompt = re.sub("\s+", " ", prompt.lstrip())
+    while True:
+        workers = str(input(prompt)).strip() or "1"
         print()
-
-    # Create and save stepchart data.
-    df = pd.DataFrame(
-        data=all_chart_data, columns=["Song Title", "Step Type", "Level", "Steps"]
-    )
-    df.to_csv(csv_path, index=False)
+        try:
+            workers = min(max(int(workers), 1), max_workers)
+            break
+        except ValueError:
+            print(f"{workers} is not a whole number.")
+            print()
+
+    # Crawl through the .ssc directory and serialize steps, reusing the
+    # steps serialized by previous crawls where possible.
+    sscs = crawl(ssc_directory, valid_packs=packs)
+    manifest_path = os.path.join(data_folder, f"{file_name}.manifest.jsonl")
+    manifest = CrawlManifest(manifest_path)
+    with ChartDataWriter(csv_path) as writer, CorpusWriter(corpus_path) as corpus:
+        for ssc, chart_data in update_sscs(sscs, manifest, workers=workers):
+            # Save the stepchart data as soon as it is available. The pack
+            # folder is two levels above the .ssc file.
+            writer.write(chart_data)
+            pack = os.path.basename(os.path.dirname(os.path.dirname(ssc)))
+            corpus.write(chart_data, pack)
+    manifest.compact(sscs)
+
+    # Index the n-grams of the corpus for fast pattern searches.
+    index = NGramIndex()
+    index.add(CorpusStore(corpus_path))
+    index.save(os.path.join(corpus_path, "ngrams.npz"))
@@ -4,6 +4,7 @@ files.
 """
 
 import os, re
+from typing import Iterator
 
 
 class SSCFile:
@@ -15,7 +16,13 @@ class SSCFile:
     parser will separate the two and get the attributes of each.
     """
 
-    def __init__(self, file_path: str, verbose=True):
+    # This finds the characters which delimit attributes and comments,
+    # and the lines which are dropped.
+    token_pattern = re.compile(
+        rb"^[=<>/][^\n]*\n?|//[^\n]*|\\.|[#;]", re.DOTALL | re.MULTILINE
+    )
+
+    def __init__(self, file_path: str, verbose=True, lazy=False):
         """
         Initializes an SSCFile object from a path to an .ssc file.
 
@@ -25,6 +32,11 @@ class SSCFile:
             A file path to an .ssc file.
         verbose : bool
             If true, prints a message if the parsing is successful.
+        lazy : bool
+            If true, only the headers of the stepchart sections are
+            parsed. The notes of a stepchart are read from the file
+            when they are first accessed, so the notes of stepcharts
+            which are never used are never extracted.
         """
         # Raise an error if the file name is not a valid path.
         if not os.path.isfile(file_path):
@@ -36,12 +48,13 @@ class SSCFile:
             raise ValueError(f"{file_path} is not an .ssc file")
 
         # Find sections.
-        lines = open(file_path, "r", encoding="utf-8").readlines()
-        sections = self.parse_sections(lines)
+        self.file_path = file_path
+        with open(file_path, "rb") as f:
+            buffer = f.read()
+        sections = self.parse_sections(buffer, lazy)
 
         # Get global attributes.
-        global_header = sections["global_header"]
-        self.global_attributes = self.parse_attributes(global_header)
+        self.global_attributes = sections["global_header"]
 
         # Parse stepchart sections.
         stepcharts = sections["stepcharts"]
@@ -53,7 +66,128 @@ class SSCFile:
             name = file_path.split(os.path.sep)[-1]
             print(f"{name} successfuly parsed.")
 
-    def parse_sections(self, lines: list[str]) -> dict:
+    def tokenize(
+        self, buffer: bytes, lazy: bool = False
+    ) -> Iterator[tuple[str, str | tuple[int, int]]]:
+        """
+        Scan the contents of an .ssc file for attributes.
+
+        Attributes take the form '#[KEY]:[VALUE];'. The buffer is
+        scanned once, stopping only at number signs, semicolons,
+        backslash escapes, '//' comments, which run to the end of the
+        line, and lines starting with '=', '<', '>', or '/', which are
+        dropped along with their line break. An escaped character is
+        taken literally. A number sign begins a new attribute only if it
+        is the first character on its line, so an attribute missing its
+        closing semicolon ends at the next line starting with a number
+        sign. Line breaks are removed from attribute values, except for
+        the value of the NOTES attribute, in which they are normalized
+        to line feeds.
+
+        Arguments
+        ---------
+        buffer : bytes
+            The contents of an .ssc file.
+        lazy : bool
+            If true, the value of each NOTES attribute is not
+            extracted. The start and end positions of the raw value in
+            the buffer are yielded instead.
+
+        Returns
+        -------
+        attributes : Iterator[tuple[str, str | tuple[int, int]]]
+            Yields the key and value of each attribute in the order in
+            which they occur. Stepchart sections begin with a NOTEDATA
+            attribute.
+        """
+        in_attribute = False
+        skip_value = False
+        pieces = []
+        pos = 0
+
+        for match in self.token_pattern.finditer(buffer):
+            token = match.group()
+            start, end = match.span()
+
+            # Outside of an attribute, look only for a number sign.
+            if not in_attribute:
+                if token == b"#":
+                    in_attribute = True
+                    skip_value = lazy and buffer.startswith(b"NOTES:", end)
+                    pieces.clear()
+                    pos = end
+                continue
+
+            if token == b"#" or token == b";":
+                # Ignore number signs within a line.
+                if token == b"#":
+                    line_start = buffer.rfind(b"\n", 0, start) + 1
+                    if buffer[line_start:start].strip():
+                        continue
+
+                # End the current attribute.
+                if skip_value:
+                    yield "NOTES", (pos + len(b"NOTES:"), start)
+                else:
+                    pieces.append(buffer[pos:start])
+                    yield self.split_attribute(b"".join(pieces))
+
+                # A number sign also begins the next attribute.
+                in_attribute = token == b"#"
+                skip_value = lazy and buffer.startswith(b"NOTES:", end)
+                pieces.clear()
+                pos = end
+            elif skip_value:
+                continue
+            elif token.startswith(b"\\"):
+                pieces.append(buffer[pos:start])
+                pieces.append(token[1:])
+                pos = end
+            else:
+                # Drop comments and lines starting with '=', '<', '>', or
+                # '/'.
+                pieces.append(buffer[pos:start])
+                pos = end
+
+        # Keep an attribute which is missing its closing semicolon at
+        # the end of the file.
+        if in_attribute:
+            if skip_value:
+                yield "NOTES", (pos + len(b"NOTES:"), len(buffer))
+            else:
+                pieces.append(buffer[pos:])
+                yield self.split_attribute(b"".join(pieces))
+
+    def split_attribute(self, attribute: bytes) -> tuple[str, str]:
+        """
+        Split the text of an attribute into its key and value.
+
+        Arguments
+        ---------
+        attribute : bytes
+            The text between the number sign and the semicolon of an
+            attribute, with comments and escapes removed.
+
+        Returns
+        -------
+        key : str
+            The key of the attribute.
+        value : str
+            The value of the attribute.
+        """
+        key, _, value = attribute.partition(b":")
+        key = key.decode("utf-8").strip()
+
+        # Remove line breaks, except from the note data.
+        if key == "NOTES":
+            if b"\r" in value:
+                value = value.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+        else:
+            value = value.replace(b"\r", b"").replace(b"\n", b"")
+
+        return key, value.decode("utf-8")
+
+    def parse_sections(self, buffer: bytes, lazy: bool = False) -> dict:
         """
         Parse the sections of the .ssc file.
 
@@ -67,31 +201,37 @@ class SSCFile:
 
         Arguments
         ---------
-        lines : list[str]
-            A list containing the lines of text in the .ssc file.
+        buffer : bytes
+            The contents of the .ssc file.
+        lazy : bool
+            If true, the notes of each stepchart are given by their
+            position in the file rather than extracted.
 
         Returns
         -------
         parsed_sections: dict
-            A dictionary whose values are the global header section and
-            a list containing the stepchart sections.
+            A dictionary whose values are the attributes of the global
+            header section and a list containing the attributes of the
+            stepchart sections.
         """
-        # Remove comments.
-        lines = filter(lambda s: not re.match("[=<>\/]", s), lines)
-
-        delim = "#NOTEDATA:;"  # This separates stepchart sections.
-        all_lines = "\n".join(lines)
-        sections = all_lines.split(delim)
+        # A NOTEDATA attribute separates stepchart sections.
+        sections = [dict()]
+        for key, value in self.tokenize(buffer, lazy):
+            if key == "NOTEDATA":
+                sections.append(dict())
+            # Ignore any attributes following the notes of a stepchart.
+            elif "NOTES" not in sections[-1]:
+                sections[-1][key] = value
 
         # Raise an error if the song title is not found.
         assert (
-            "#TITLE" in sections[0]
+            "TITLE" in sections[0]
         ), f"Error in parsing {self.file_path}: missing song title."
 
         # Raise an error if the step type is not found.
         for section in sections[1:]:
             assert (
-                "#STEPSTYPE" in section
+                "STEPSTYPE" in section
             ), f"Error in parsing {self.file_path}: missing step type."
 
         parsed_sections = {
@@ -101,94 +241,45 @@ class SSCFile:
 
         return parsed_sections
 
-    def parse_attributes(self, header: str) -> dict:
-        """
-        Parse the attributes of the header section of the .ssc file.
-
-        Each section of the .ssc file contains a header. A section
-        header contains various attributes of the form
-        '#[KEY]:[VALUE];'.
-
-        Arguments
-        ---------
-        header : str
-            The header of a section of the .ssc file.
-
-        Returns
-        -------
-        attributes : dict
-            Maps the key of each attribute to its corresponding value.
-        """
-        # Insert missing semicolons and remove extras.
-        header = re.sub("\n+", "", header)
-        header = header.replace("#", ";#")
-        header = header.replace(";;", ";")
-        header = header[1:]
-
-        # Replace escaped semicolons to prevent splitting issues.
-        header = header.replace("\\:", "Ͽ")
-
-        # Attribute key and values are separated by a semicolon.
-        key_vals = header.split(";")
-
-        # Get the key and value of all attributes.
-        atts = dict()
-        for key_val in key_vals:
-            # Ignore empty attributes.
-            if not key_val:
-                continue
-
-            key_val = key_val.split("//")[0]  # Remove comments.
-            if ":" in key_val:
-                key, val = key_val.split(":")[:2]
-            if key[0] == "#":
-                key = key[1:]
-                # Restore escaped semicolons/number signs.
-                val = val.replace("Ͽ", ":")
-                val = val.replace("Ͼ", "#")
-
-                atts[key] = val
-
-        return atts
-
-    def parse_stepcharts(self, stepcharts: list[str]) -> list[dict]:
+    def parse_stepcharts(self, stepcharts: list[dict]) -> list[dict]:
         """
         Parse the stepchart sections of the .ssc file.
 
-        Each stepchart section contains a header section and a note
-        section. This fuction will separate the two and get the
-        attributes stored in the header section.
+        Each stepchart section contains header attributes and a note
+        section, given by the NOTES attribute. This fuction will
+        separate the two and fill in any timing attributes missing from
+        the header with those of the global header. If the position of
+        the notes in the file is given instead of the notes, the
+        parsed section will read the notes when they are accessed.
 
         Arguments
         ---------
-        stepcharts : list[str]
-            A list containing the stepchart sections of the .ssc file.
+        stepcharts : list[dict]
+            A list containing the attributes of the stepchart sections
+            of the .ssc file.
 
         Returns
         -------
         parsed_stepcharts: list[dict]
             A list containing the parsed stepchart sections.
         """
-        delim = "#NOTES:"  # This separates the header from the stepcharts.
         parsed_stepcharts = []
 
         # Parse the attributes and notes of each stepchart.
-        for stepchart in stepcharts:
-            parsed_stepchart = dict()
-            sections = stepchart.split(delim)
+        for attributes in stepcharts:
             # Ignore blank stepcharts.
-            if len(sections) < 2:
+            if "NOTES" not in attributes:
                 continue
 
-            header, notes = sections[0], sections[1]
-            attributes = self.parse_attributes(header)
-
-            # Find the end of the notes and remove trailing spaces.
-            notes = notes[: notes.index(";")]
-            notes = notes.strip()
+            notes = attributes.pop("NOTES")
+            if isinstance(notes, tuple):
+                parsed_stepchart = LazyStepchart(self, notes)
+            else:
+                # Remove trailing spaces from the notes.
+                parsed_stepchart = dict()
+                parsed_stepchart["notes"] = notes.strip()
 
             parsed_stepchart["attributes"] = attributes
-            parsed_stepchart["notes"] = notes
             parsed_stepcharts.append(parsed_stepchart)
 
             # Add initial timing data if it's missing.
@@ -197,3 +288,60 @@ class SSCFile:
                 atts[key] = atts.get(key, self.global_attributes[key])
 
         return parsed_stepcharts
+
+    def read_notes(self, start: int, end: int) -> str:
+        """
+        Read the notes of a stepchart from the .ssc file.
+
+        Arguments
+        ---------
+        start : int
+            The position of the first byte of the raw NOTES value.
+        end : int
+            The position following the last byte of the raw NOTES
+            value.
+
+        Returns
+        -------
+        notes : str
+            The notes, as they would be parsed from the whole file.
+        """
+        with open(self.file_path, "rb") as f:
+            f.seek(start)
+            notes = f.read(end - start)
+
+        # Remove comments from the raw value as the tokenizer would.
+        _, notes = next(self.tokenize(b"#NOTES:" + notes + b";"))
+        notes = notes.strip()
+
+        return notes
+
+
+class LazyStepchart(dict):
+    """
+    A parsed stepchart section whose notes are read from the .ssc file
+    when the 'notes' item is first accessed.
+    """
+
+    def __init__(self, ssc: SSCFile, notes_span: tuple[int, int]):
+        """
+        Initialize a LazyStepchart object.
+
+        Arguments
+        ---------
+        ssc : SSCFile
+            The parsed .ssc file containing the stepchart.
+        notes_span : tuple[int, int]
+            The start and end positions of the raw NOTES value in the
+            file.
+        """
+        super().__init__()
+        self.ssc = ssc
+        self.notes_span = notes_span
+
+    def __missing__(self, key: str) -> str:
+        if key != "notes":
+            raise KeyError(key)
+        self["notes"] = self.ssc.read_notes(*self.notes_span)
+
+        return self["notes"]
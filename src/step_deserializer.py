@@ -0,0 +1,345 @@
+"""
+This module contains the StepDeserializer class, which can be used to
+convert serialized steps back to arrays of step events.
+"""
+
+from typing import Iterable
+import numpy as np
+from step_serializer import StepSerializer
+
+
+class StepDeserializer:
+    """
+    Convert serialized stepcharts to arrays of events.
+
+    Serialized steps are parsed on their bytes, so a whole column of
+    stepcharts is converted with a fixed number of array operations.
+    Only the distinct step strings, of which there are few, are parsed
+    one at a time. The events have dtype StepSerializer.event_dtype.
+    """
+
+    def __init__(self):
+        """
+        Initialize a StepDeserializer object.
+        """
+        self.serializer = StepSerializer()
+
+    def deserialize(self, steps: str) -> np.ndarray:
+        """
+        Convert the serialized steps of a stepchart to an array of
+        events.
+
+        Converting the events back with StepSerializer.events_to_text
+        gives the original text.
+
+        Arguments
+        ---------
+        steps : str
+            Serialized steps, as produced by
+            StepSerializer.serialize_steps.
+
+        Returns
+        -------
+        events : np.ndarray
+            An array with dtype StepSerializer.event_dtype containing an
+            event for each token.
+        """
+        events, _ = self.deserialize_column([steps])
+
+        return events
+
+    def deserialize_column(
+        self, column: Iterable[str]
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Convert the serialized steps of many stepcharts to arrays of
+        events.
+
+        Converting the events of a stepchart back with
+        StepSerializer.events_to_text gives the original text.
+
+        Arguments
+        ---------
+        column : Iterable[str]
+            The serialized steps of each stepchart, such as the 'Steps'
+            column of the data produced by ssc_crawler.
+
+        Returns
+        -------
+        events : np.ndarray
+            An array with dtype StepSerializer.event_dtype containing the
+            events of all stepcharts back to back.
+        offsets : np.ndarray
+            An array containing the index of the first event of each
+            stepchart followed by the total number of events, so that
+            the events of stepchart i are events[offsets[i]:offsets[i + 1]].
+        """
+        text, token_starts, colons, token_ends, offsets = self.tokenize(column)
+        ms, flagged = self.parse_timestamps(text, token_starts, colons)
+        masks = self.parse_step_strings(text, colons + 1, token_ends)
+
+        events = np.zeros(len(ms), dtype=StepSerializer.event_dtype)
+        events["ms"] = ms
+        for i, field in enumerate(StepSerializer.event_dtype.names[1:]):
+            events[field] = masks[i]
+        events["taps"][flagged] |= StepSerializer.negative_zero
+
+        return events, offsets
+
+    def tokenize(
+        self, column: Iterable[str]
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Find the tokens of many serialized stepcharts.
+
+        The stepcharts are joined by newlines into a single text, and
+        tokens are located by their positions in this text.
+
+        Arguments
+        ---------
+        column : Iterable[str]
+            The serialized steps of each stepchart.
+
+        Returns
+        -------
+        text : np.ndarray
+            A uint8 array of the characters of the joined stepcharts.
+        token_starts : np.ndarray
+            The position of the first character of each token.
+        colons : np.ndarray
+            The position of the colon of each token.
+        token_ends : np.ndarray
+            The position after the last character of each token.
+        offsets : np.ndarray
+            An array containing the index of the first token of each
+            stepchart followed by the total number of tokens.
+        """
+        # Join the stepcharts with a character which steps never contain.
+        column = list(column)
+        text = np.frombuffer("\n".join(column).encode("ascii"), dtype=np.uint8)
+        lengths = np.array([len(steps) for steps in column], dtype=np.int64)
+        chart_starts = np.cumsum(lengths + 1) - lengths - 1
+        chart_ends = chart_starts + lengths
+
+        # A hyphen separates tokens unless it is the sign of a timestamp,
+        # which begins a stepchart or follows another hyphen.
+        hyphen = text == ord("-")
+        previous = np.concatenate([[ord("\n")], text[:-1]])
+        separators = np.flatnonzero(
+            hyphen & (previous != ord("-")) & (previous != ord("\n"))
+        )
+        nonempty = lengths > 0
+        token_starts = np.sort(np.concatenate([chart_starts[nonempty], separators + 1]))
+        token_ends = np.sort(np.concatenate([chart_ends[nonempty], separators]))
+        offsets = np.searchsorted(token_starts, np.append(chart_starts, len(text) + 1))
+
+        # Each token has exactly one colon, separating its timestamp from
+        # its steps.
+        colons = np.flatnonzero(text == ord(":"))
+        token = np.searchsorted(token_starts, colons, side="right") - 1
+        if (
+            len(colons) != len(token_starts)
+            or (token != np.arange(len(colons))).any()
+            or (colons >= token_ends).any()
+        ):
+            raise ValueError("Each token of serialized steps needs one colon.")
+
+        return text, token_starts, colons, token_ends, offsets
+
+    def parse_timestamps(
+        self, text: np.ndarray, starts: np.ndarray, ends: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Convert timestamps to integer milliseconds.
+
+        Timestamps are read digit by digit, and must be written as
+        serialize_steps writes them: the shortest decimal of a whole
+        number of milliseconds, with at least one digit after the point.
+
+        Arguments
+        ---------
+        text : np.ndarray
+            A uint8 array of characters.
+        starts : np.ndarray
+            The index of the first character of each timestamp.
+        ends : np.ndarray
+            The index after the last character of each timestamp.
+
+        Returns
+        -------
+        ms : np.ndarray
+            The timestamps in milliseconds.
+        flagged : np.ndarray
+            A boolean array which is true for timestamps written as -0.0.
+        """
+        positions, segments = StepDeserializer.segment_positions(starts, ends)
+        chars = text[positions]
+        signs = text[np.clip(starts, 0, len(text) - 1)] == ord("-")
+        negative = (ends > starts) & signs
+        is_dot = chars == ord(".")
+        is_digit = (chars >= ord("0")) & (chars <= ord("9"))
+        dot = np.full(len(starts), -1, dtype=np.int64)
+        dot[segments[is_dot]] = positions[is_dot]
+
+        # Every character other than the sign and the point is a digit,
+        # the integer part has no leading zeros, and the fraction has one
+        # to three digits without trailing zeros.
+        int_digits = dot - starts - negative
+        frac_digits = ends - dot - 1
+        first = text[np.clip(starts + negative, 0, len(text) - 1)]
+        last = text[np.clip(ends - 1, 0, len(text) - 1)]
+        sign = negative[segments] & (positions == starts[segments])
+        other = ~(is_digit | is_dot | sign)
+        valid = (
+            (np.bincount(segments, weights=is_dot, minlength=len(starts)) == 1)
+            & (np.bincount(segments, weights=other, minlength=len(starts)) == 0)
+            & (int_digits >= 1)
+            & ((int_digits == 1) | (first != ord("0")))
+            & (frac_digits >= 1)
+            & (frac_digits <= 3)
+            & ((frac_digits == 1) | (last != ord("0")))
+        )
+        if not valid.all():
+            i = np.argmin(valid)
+            timestamp = bytes(text[starts[i] : ends[i]]).decode()
+            raise ValueError(f"Timestamp {timestamp} is not rounded to milliseconds.")
+        if (int_digits > 7).any():
+            raise ValueError("Events cannot store timestamps past 24 days.")
+
+        # Weight each digit by its place value in milliseconds.
+        place = dot[segments] - positions + 2
+        place = np.where(positions > dot[segments], place + 1, place)
+        values = np.where(is_digit, (chars - ord("0")) * 10 ** np.clip(place, 0, 9), 0)
+        ms = np.bincount(segments, weights=values, minlength=len(starts))
+        ms = np.where(negative, -ms, ms).astype(np.int64)
+        if (np.abs(ms) >= 2**31).any():
+            raise ValueError("Events cannot store timestamps past 24 days.")
+        flagged = negative & (ms == 0)
+
+        return ms, flagged
+
+    def parse_float_timestamps(
+        self, text: np.ndarray, starts: np.ndarray, ends: np.ndarray
+    ) -> np.ndarray:
+        """
+        Convert timestamps written in any form accepted by float to
+        seconds.
+
+        Arguments
+        ---------
+        text : np.ndarray
+            A uint8 array of characters.
+        starts : np.ndarray
+            The index of the first character of each timestamp.
+        ends : np.ndarray
+            The index after the last character of each timestamp.
+
+        Returns
+        -------
+        secs : np.ndarray
+            The timestamps in seconds.
+        """
+        text = text.tobytes()
+        bounds = zip(starts.tolist(), ends.tolist())
+        secs = np.array([float(text[start:end]) for start, end in bounds], dtype=float)
+
+        return secs
+
+    def parse_step_strings(
+        self, text: np.ndarray, starts: np.ndarray, ends: np.ndarray
+    ) -> np.ndarray:
+        """
+        Get the bitmasks of the panels with each kind of step in step
+        strings.
+
+        Only strings written by StepSerializer.step_string can be
+        converted, which are those listing taps, then hold caps, then
+        hold interiors and tails, each in panel order.
+
+        Arguments
+        ---------
+        text : np.ndarray
+            A uint8 array of characters.
+        starts : np.ndarray
+            The index of the first character of each step string.
+        ends : np.ndarray
+            The index after the last character of each step string.
+
+        Returns
+        -------
+        masks : np.ndarray
+            A 2D array whose rows are bitmasks of the panels with taps,
+            hold caps, hold interiors, and hold tails.
+        """
+        panels = "".join(self.serializer.panels["D"])
+        panel_table = np.full(256, -1, dtype=np.int64)
+        panel_table[[ord(panel) for panel in panels]] = np.arange(len(panels))
+        panel_table[[ord(panel) for panel in panels.lower()]] = np.arange(len(panels))
+
+        positions, segments = StepDeserializer.segment_positions(starts, ends)
+        padded = np.append(text, np.uint8(0))
+        chars = padded[positions]
+        following = np.where(positions + 1 < ends[segments], padded[positions + 1], 0)
+        panel = panel_table[chars]
+        letter = panel >= 0
+        upper = letter & (chars <= ord("Z"))
+        lower = letter & ~upper
+
+        # A lowercase letter is a hold cap or tail if followed by 1 or 0,
+        # and a hold interior otherwise.
+        cap = lower & (following == ord("1"))
+        tail = lower & (following == ord("0"))
+        suffix = np.zeros(len(chars), dtype=bool)
+        suffix[1:] = (cap | tail)[:-1] & (segments[1:] == segments[:-1])
+
+        # Each step must come after the previous step of its string in
+        # the order in which step_string lists steps.
+        order = np.where(upper, panel, np.where(cap, 16 + panel, 32 + 2 * panel + tail))
+        order, step_segments = order[letter], segments[letter]
+        unordered = np.flatnonzero(
+            (order[1:] <= order[:-1]) & (step_segments[1:] == step_segments[:-1])
+        )
+        invalid = np.concatenate(
+            [segments[~(letter | suffix)], step_segments[unordered + 1]]
+        )
+        if len(invalid) > 0:
+            i = invalid.min()
+            string = bytes(text[starts[i] : ends[i]]).decode()
+            self.serializer.parse_step_string(string)
+            raise ValueError(f"Steps {string} cannot be stored as an event.")
+
+        bits = np.where(letter, 1 << np.maximum(panel, 0), 0)
+        kinds = [upper, cap, lower & ~cap & ~tail, tail]
+        masks = np.zeros((4, len(starts)), dtype=np.int64)
+        for i, kind in enumerate(kinds):
+            masks[i] = np.bincount(segments, weights=bits * kind, minlength=len(starts))
+
+        return masks
+
+    @staticmethod
+    def segment_positions(
+        starts: np.ndarray, ends: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        List the positions covered by a sequence of segments.
+
+        Arguments
+        ---------
+        starts : np.ndarray
+            The first position of each segment.
+        ends : np.ndarray
+            The position after the last position of each segment.
+
+        Returns
+        -------
+        positions : np.ndarray
+            The positions in each segment, in order.
+        segments : np.ndarray
+            The index of the segment containing each position.
+        """
+        lengths = ends - starts
+        segments = np.repeat(np.arange(len(starts)), lengths)
+        firsts = np.cumsum(lengths) - lengths
+        positions = np.arange(lengths.sum()) - (firsts - starts)[segments]
+
+        return positions, segments
@@ -3,7 +3,17 @@ This module contains the StepPatternSearcher class, which can be used
 to search for patterns within Pump It Up stepcharts.
 """
 
-import re
+import heapq, re, time
+from collections.abc import Iterator
+from functools import lru_cache
+import pandas as pd, numpy as np
+from corpus_store import CorpusStore
+from ngram_index import NGramIndex
+from pattern_automaton import PatternAutomaton
+from run_detector import RunDetector
+from step_deserializer import StepDeserializer
+from step_serializer import StepSerializer
+from token_matcher import TokenMatcher
 
 
 class StepPatternSearcher:
@@ -13,6 +23,10 @@ class StepPatternSearcher:
     This class searches for step patterns within a serialized stepchart
     by using regular expressions. One can specify a range of speeds at
     which the pattern should occur.
+
+    The compiled regular expressions of recently searched patterns are
+    kept in a least recently used cache, so searching many charts for
+    the same pattern builds and compiles its expressions only once.
     """
 
     num_pattern = "[0-9\.]+"  # This picks up timestamps in the chart.
@@ -53,46 +67,282 @@ class StepPatternSearcher:
             "n": "z",
         },
     }
+    flips = {  # This is used to flip patterns from top to bottom.
+        "S": {
+            "Z": "Q",
+            "Q": "Z",
+            "E": "C",
+            "C": "E",
+            "z": "q",
+            "q": "z",
+            "e": "c",
+            "c": "e",
+        },
+        "D": {
+            "Z": "Q",
+            "Q": "Z",
+            "E": "C",
+            "C": "E",
+            "V": "R",
+            "R": "V",
+            "Y": "N",
+            "N": "Y",
+            "z": "q",
+            "q": "z",
+            "e": "c",
+            "c": "e",
+            "v": "r",
+            "r": "v",
+            "y": "n",
+            "n": "y",
+        },
+    }
+    shifts = {  # This is used to swap the halves of doubles patterns.
+        "D": {
+            "Z": "V",
+            "Q": "R",
+            "S": "G",
+            "E": "Y",
+            "C": "N",
+            "V": "Z",
+            "R": "Q",
+            "G": "S",
+            "Y": "E",
+            "N": "C",
+            "z": "v",
+            "q": "r",
+            "s": "g",
+            "e": "y",
+            "c": "n",
+            "v": "z",
+            "r": "q",
+            "g": "s",
+            "y": "e",
+            "n": "c",
+        },
+    }
+    transform_names = [  # This lists the symmetries of the pad.
+        "identity",
+        "mirror",
+        "flip",
+        "rotate",
+        "shift",
+        "shift mirror",
+        "shift flip",
+        "shift rotate",
+    ]
 
-    def get_regex_pattern(
-        self, step_pattern: str, hold_distinctions: bool, repeat: bool
-    ) -> list[str]:
+    def __init__(self, cache_size: int = 256):
         """
-        Convert an input step pattern into a regular expression.
+        Initialize a StepPatternSearcher object.
 
-        To convert the step pattern into a regular expression,
-        expressions which correspond to the colon separator and the
-        timestamps found in a serialized stepchart need to be added.
-        Characters corresponding to panels are sorted so that searches
-        do not dependent on the order in which panels are written in
-        the input pattern.
+        Arguments
+        ---------
+        cache_size : int
+            The maximum number of step patterns whose compiled regular
+            expressions are cached.
+        """
+        self.get_compiled_patterns = lru_cache(maxsize=cache_size)(
+            self.compile_patterns
+        )
+        self.serializer = StepSerializer()
+        self.deserializer = StepDeserializer()
+
+    def cache_info(self):
+        """
+        Return the hits, misses, maximum size, and current size of the
+        cache of compiled patterns.
+        """
+        return self.get_compiled_patterns.cache_info()
+
+    def compile_patterns(
+        self, step_pattern: str, step_type: str, hold_distinctions: bool
+    ) -> tuple[re.Pattern]:
+        """
+        Compile the regular expressions used to search for a step
+        pattern and its mirror image.
+
+        Searches use get_compiled_patterns, which caches the output of
+        this method.
 
         Arguments
         ---------
         step_pattern : str
             A string representing the step pattern to search for.
+        step_type : str
+            Equal to 'S' if the chart is a singles chart or 'D' if the
+            chart is a doubles chart.
         hold_distinctions : bool
             If true, the caps/tails/interiors of holds will be
             distinguished for searching.
-        repeat : bool
-            If true, the pattern will be modified to look for the
-            longest sequences formed by concatenating the input
-            pattern.
 
         Returns
         -------
-        pattern : str
-            A list containing timestamps at which the pattern can be
-            found.
+        patterns : tuple[re.Pattern]
+            The compiled regular expression of the step pattern,
+            followed by that of the mirrored step pattern if it differs.
+        """
+        patterns = [
+            self.get_regex_pattern(pattern, hold_distinctions)
+            for pattern in self.get_step_patterns(step_pattern, step_type)
+        ]
+
+        return tuple(re.compile(pattern) for pattern in patterns)
+
+    def get_step_patterns(self, step_pattern: str, step_type: str) -> list[str]:
+        """
+        Return a step pattern followed by its mirror image if the two
+        differ.
+
+        Arguments
+        ---------
+        step_pattern : str
+            A string representing the step pattern to search for.
+        step_type : str
+            Equal to 'S' if the chart is a singles chart or 'D' if the
+            chart is a doubles chart.
+
+        Returns
+        -------
+        step_patterns : list[str]
+            The step patterns to search for.
+        """
+        step_patterns = [step_pattern]
+        mirrored_step_pattern = "".join(
+            [self.mirrors[step_type].get(char, char) for char in step_pattern]
+        )
+        if mirrored_step_pattern != step_pattern:
+            step_patterns.append(mirrored_step_pattern)
+
+        return step_patterns
+
+    def get_transforms(self, step_type: str) -> dict[str, dict[str, str]]:
+        """
+        Return the symmetries of the pad of a step type as mappings
+        between panels.
+
+        Singles patterns can be mirrored from left to right, flipped
+        from top to bottom, or rotated by 180 degrees, which does both.
+        Doubles patterns can also have the halves of the pad swapped,
+        which shifts a pattern on one half of the pad to the other.
+
+        Arguments
+        ---------
+        step_type : str
+            Equal to 'S' if the chart is a singles chart or 'D' if the
+            chart is a doubles chart.
+
+        Returns
+        -------
+        transforms : dict[str, dict[str, str]]
+            A mapping from the name of each transform, in the order of
+            transform_names, to a mapping between panels. Panels missing
+            from a mapping are left in place.
+        """
+        mirror, flip = self.mirrors[step_type], self.flips[step_type]
+        rotate = {step: flip.get(mirror[step], mirror[step]) for step in mirror}
+        transforms = {"identity": dict(), "mirror": mirror, "flip": flip}
+        transforms["rotate"] = rotate
+        if step_type == "D":
+            shift = self.shifts[step_type]
+            for name, transform in list(transforms.items()):
+                name = "shift" if name == "identity" else f"shift {name}"
+                transforms[name] = {
+                    step: shift.get(transform.get(step, step), step) for step in shift
+                }
+
+        return transforms
+
+    def get_pattern_variants(
+        self, step_pattern: str, step_type: str, symmetric: bool = False
+    ) -> list[tuple[int, str]]:
+        """
+        Return the step patterns to search for in place of a step
+        pattern, together with the transform producing each.
+
+        Arguments
+        ---------
+        step_pattern : str
+            A string representing the step pattern to search for.
+        step_type : str
+            Equal to 'S' if the chart is a singles chart or 'D' if the
+            chart is a doubles chart.
+        symmetric : bool
+            If true, the pattern is transformed by every symmetry of the
+            pad, and images with the same notes as an earlier image are
+            skipped. Otherwise, the pattern is followed by its mirror
+            image if the two differ, as returned by get_step_patterns.
+
+        Returns
+        -------
+        variants : list[tuple[int, str]]
+            The index in transform_names of each transform, and the
+            transformed step pattern.
+        """
+        if not symmetric:
+            return list(enumerate(self.get_step_patterns(step_pattern, step_type)))
+
+        variants, seen = [], set()
+        for name, transform in self.get_transforms(step_type).items():
+            pattern = "".join([transform.get(char, char) for char in step_pattern])
+            if self.sort_notes(pattern) not in seen:
+                seen.add(self.sort_notes(pattern))
+                variants.append((self.transform_names.index(name), pattern))
+
+        return variants
+
+    def sort_notes(self, step_pattern: str) -> str:
+        """
+        Sort the steps of each note of a step pattern, so that patterns
+        with the same notes are equal.
+
+        Arguments
+        ---------
+        step_pattern : str
+            A string representing a step pattern.
+
+        Returns
+        -------
+        step_pattern : str
+            The step pattern with the steps of each note sorted.
+        """
+        notes = [
+            "".join(sorted(steps, key=lambda c: self.order.index(c)))
+            if steps != "*"
+            else steps
+            for steps in step_pattern.split("-")
+        ]
+
+        return "-".join(notes)
+
+    def get_note_patterns(
+        self, step_pattern: str, hold_distinctions: bool
+    ) -> list[str]:
         """
-        pattern = []
+        Convert the notes of a step pattern into regular expressions
+        matching the steps of a note in a serialized stepchart.
+
+        Arguments
+        ---------
+        step_pattern : str
+            A string representing the step pattern to search for.
+        hold_distinctions : bool
+            If true, the caps/tails/interiors of holds will be
+            distinguished for searching.
+
+        Returns
+        -------
+        note_patterns : list[str]
+            A regular expression for the steps of each note.
+        """
+        note_patterns = []
         notes = step_pattern.split("-")
 
         for i, steps in enumerate(notes):
             # Create the pattern to search for a generic note.
             if steps == "*":
                 chars = f"{self.order}[0-1]"
-                subpattern = f"{self.num_pattern}:[{chars}]*"
+                note_pattern = f"[{chars}]*"
 
             # Create the patternt to search for a specfiic note.
             else:
@@ -105,15 +355,43 @@ class StepPatternSearcher:
                     for j, step in enumerate(steps):
                         if step.islower():
                             steps[j] = f"{step}[0-1]{{0,1}}"
-                steps = "".join(steps)
-                subpattern = f"{self.num_pattern}:{steps}"
-            pattern.append(subpattern)
+                note_pattern = "".join(steps)
+            note_patterns.append(note_pattern)
 
-        pattern = "-".join(pattern)
-        if repeat:
-            pattern = f"[{pattern}]*"
+        return note_patterns
+
+    def get_regex_pattern(self, step_pattern: str, hold_distinctions: bool) -> str:
+        """
+        Convert an input step pattern into a regular expression.
+
+        To convert the step pattern into a regular expression,
+        expressions which correspond to the colon separator and the
+        timestamps found in a serialized stepchart need to be added.
+        Characters corresponding to panels are sorted so that searches
+        do not dependent on the order in which panels are written in
+        the input pattern.
+
+        Arguments
+        ---------
+        step_pattern : str
+            A string representing the step pattern to search for.
+        hold_distinctions : bool
+            If true, the caps/tails/interiors of holds will be
+            distinguished for searching.
 
-        return pattern
+        Returns
+        -------
+        pattern : str
+            A list containing timestamps at which the pattern can be
+            found.
+        """
+        # Precede the steps of each note by a timestamp and a colon.
+        pattern = [
+            f"{self.num_pattern}:{note_pattern}"
+            for note_pattern in self.get_note_patterns(step_pattern, hold_distinctions)
+        ]
+
+        return "-".join(pattern)
 
     def search(
         self,
@@ -125,6 +403,8 @@ class StepPatternSearcher:
         tol: float = 0.01,
         hold_distinctions: bool = False,
         repeat: bool = False,
+        backend: str = "regex",
+        symmetric: bool = False,
     ) -> list[list[float]]:
         """
         Search a chart for a step pattern within a speed range.
@@ -157,28 +437,93 @@ class StepPatternSearcher:
             If true, the caps/tails/interiors of holds will be
             distinguished for searching.
         repeat : bool
-            If true, the searcher will look for the longest sequences
-            formed by concatenating the input pattern.
+            If true, the searcher will look for maximal runs of
+            back-to-back repetitions of the pattern, as found by the
+            RunDetector class, instead of single matches.
+        backend : str
+            The search engine to use. If 'regex', the serialized chart
+            is scanned with regular expressions. If 'token', the chart
+            is converted to events which are searched with the
+            TokenMatcher class. If 'automaton', the events are searched
+            for the pattern and its mirror image in one pass with the
+            PatternAutomaton class. All give the same matches, but
+            'token' and 'automaton' require a chart which can be stored
+            as events. Runs are always found on events.
+        symmetric : bool
+            If true, the searcher will look for the images of the
+            pattern under every symmetry of the pad returned by
+            get_transforms, rather than the pattern and its mirror
+            image, and report which transform matched. The chart is
+            scanned once for all images with the PatternAutomaton
+            class, whatever the backend.
 
         Returns
         -------
         matches : list[list[float]]
             A list containing timestamps at which the pattern can be
             found and the time difference between consecutive steps.
+            If repeat is true, each run is given by its starting
+            timestamp, the mean time difference between consecutive
+            steps, and its number of repetitions. If symmetric is true,
+            each match ends with the name of its transform.
         """
-        # Get the regular expression pattern and find possible matches.
-        pattern = self.get_regex_pattern(step_pattern, hold_distinctions, repeat)
-        possible_matches = re.findall(pattern, chart)
+        if backend not in ["regex", "token", "automaton"]:
+            raise ValueError(f"Unknown search backend {backend}.")
+        variants = self.get_pattern_variants(step_pattern, step_type, symmetric)
 
-        # Find possible matches for the mirrored pattern.
-        mirrored_step_pattern = "".join(
-            [self.mirrors[step_type].get(char, char) for char in step_pattern]
+        # Find runs of each variant of the pattern.
+        if repeat:
+            events = self.deserializer.deserialize(chart)
+            detector = RunDetector(events, [0, len(events)])
+            runs = []
+            for transform, pattern in variants:
+                starts, repetitions, dts = detector.runs(
+                    self.get_note_patterns(pattern, hold_distinctions),
+                    min_dt,
+                    max_dt,
+                    tol,
+                )
+                for run in zip(
+                    detector.times[starts].tolist(), dts.tolist(), repetitions.tolist()
+                ):
+                    runs.append(list(run))
+                    if symmetric:
+                        runs[-1].append(self.transform_names[transform])
+            return runs
+
+        if backend in ["token", "automaton"] or symmetric:
+            events = self.deserializer.deserialize(chart)
+            num_notes = len(step_pattern.split("-"))
+            pattern_list = [
+                self.get_note_patterns(pattern, hold_distinctions)
+                for _, pattern in variants
+            ]
+            if backend == "automaton" or symmetric:
+                automaton = PatternAutomaton(events, [0, len(events)])
+                tokens_list = automaton.match_all(pattern_list)
+            else:
+                matcher = TokenMatcher(events, [0, len(events)])
+                tokens_list = [matcher.match(patterns) for patterns in pattern_list]
+            matches = []
+            for (transform, _), tokens in zip(variants, tokens_list):
+                timestamps, dts, valid = self.check_speeds(
+                    events["ms"] / 1000, tokens, num_notes, min_dt, max_dt, tol
+                )
+                if num_notes == 1:
+                    dts = np.zeros(len(dts), dtype=int)
+                for match in zip(timestamps[valid].tolist(), dts[valid].tolist()):
+                    matches.append(list(match))
+                    if symmetric:
+                        matches[-1].append(self.transform_names[transform])
+            return matches
+
+        # Find possible matches for the pattern and its mirror image.
+        patterns = self.get_compiled_patterns(
+            step_pattern, step_type, hold_distinctions
         )
-        if mirrored_step_pattern != step_pattern:
-            mirrored_pattern = self.get_regex_pattern(
-                mirrored_step_pattern, hold_distinctions, repeat
-            )
-            possible_matches.extend(re.findall(mirrored_pattern, chart))
+        possible_matches = []
+        for pattern in patterns:
+            possible_matches.extend(pattern.findall(chart))
 
         # Retain only matches satisfying the speed constraints.
         matches = []
@@ -211,3 +556,993 @@ class StepPatternSearcher:
                 matches.append([timestamp, time_delta])
 
         return matches
+
+    def search_corpus(
+        self,
+        corpus: pd.DataFrame | CorpusStore,
+        step_patterns: str | list[str],
+        min_dt: float = 0.0,
+        max_dt: float = 1.0,
+        tol: float = 0.01,
+        hold_distinctions: bool = False,
+        repeat: bool = False,
+        backend: str = "regex",
+        index: NGramIndex | None = None,
+        symmetric: bool = False,
+    ) -> pd.DataFrame:
+        """
+        Search every chart of a corpus for step patterns within a speed
+        range.
+
+        The matches are those which search finds in each chart, but the
+        charts of each step type are searched together: each pattern is
+        matched once against the joined charts, and the speed
+        constraints are checked for all matches at once.
+
+        Arguments
+        ---------
+        corpus : pd.DataFrame | CorpusStore
+            A data frame with the 'Step Type' and 'Steps' columns of the
+            data produced by ssc_crawler, or a CorpusStore. Either may
+            be a subset of a larger corpus.
+        step_patterns : str | list[str]
+            A step pattern or a list of step patterns to search for.
+        min_dt : float
+            The minimum time differential between steps in the pattern.
+        max_dt : float
+            The maximum time differential between steps in the pattern.
+        tol : float
+            A tolerance parameter controlling how close the time
+            differentials between steps need to be to the input range.
+        hold_distinctions : bool
+            If true, the caps/tails/interiors of holds will be
+            distinguished for searching.
+        repeat : bool
+            If true, the searcher will look for maximal runs of
+            back-to-back repetitions of each pattern, as search does.
+        backend : str
+            The search engine to use, 'regex', 'token', or 'automaton',
+            as in search. With 'token' or 'automaton', the events of a
+            CorpusStore are searched without converting them to text,
+            and timestamps must be written as serialize_steps writes
+            them. With 'regex', any timestamp which search accepts can
+            be read.
+            With 'automaton', all patterns and their mirror images are
+            found in a single pass over the charts of each step type.
+        index : NGramIndex | None
+            An index of the charts of the corpus. If given, matches are
+            looked up in the index instead of scanning the charts, and
+            only the charts containing a match are read to check their
+            speeds. The backend is then not used. If repeat is true,
+            only the charts containing a repetition of a pattern are
+            read.
+        symmetric : bool
+            If true, the searcher will look for the images of each
+            pattern under every symmetry of the pad, as search does.
+            Without an index, the charts of each step type are scanned
+            once for all patterns and images with the PatternAutomaton
+            class, whatever the backend.
+
+        Returns
+        -------
+        matches : pd.DataFrame
+            A data frame with a row for each match, giving the chart id
+            (the index of a data frame or the chart id of a
+            CorpusStore), the pattern, the timestamp at which the match
+            begins, and the time difference between consecutive steps.
+            If repeat is true, each row is a run and a 'repetitions'
+            column gives its number of repetitions, so the longest runs
+            of the corpus are found by sorting on this column. If
+            symmetric is true, a 'transform' column gives the name of
+            the transform which matched. Rows are ordered by chart, then
+            in the order of the input patterns, then as search lists
+            them.
+        """
+        if backend not in ["regex", "token", "automaton"]:
+            raise ValueError(f"Unknown search backend {backend}.")
+        if isinstance(step_patterns, str):
+            step_patterns = [step_patterns]
+        step_patterns = list(dict.fromkeys(step_patterns))
+        chart_ids, step_types = self.corpus_charts(corpus)
+
+        positions, pattern_codes, timestamps, dts = [], [], [], []
+        repetitions, transforms = [], []
+        for step_type in np.unique(step_types):
+            selected = np.flatnonzero(step_types == step_type)
+            if repeat:
+                token_positions, runs = self.run_matches(
+                    corpus,
+                    selected,
+                    step_type,
+                    step_patterns,
+                    hold_distinctions,
+                    min_dt,
+                    max_dt,
+                    tol,
+                    index,
+                    symmetric,
+                )
+                for code, transform, tokens, run_times, run_dts, run_reps in runs:
+                    positions.append(token_positions[tokens])
+                    pattern_codes.append(np.full(len(tokens), code))
+                    transforms.append(np.full(len(tokens), transform))
+                    timestamps.append(run_times)
+                    dts.append(run_dts)
+                    repetitions.append(run_reps)
+                continue
+
+            # Find the token at which each possible match begins.
+            if index is not None:
+                secs, token_positions, found = self.index_matches(
+                    corpus,
+                    selected,
+                    step_type,
+                    step_patterns,
+                    hold_distinctions,
+                    index,
+                    symmetric,
+                )
+            else:
+                secs, token_positions, found = self.scan_matches(
+                    corpus,
+                    selected,
+                    step_type,
+                    step_patterns,
+                    hold_distinctions,
+                    "automaton" if symmetric else backend,
+                    symmetric,
+                )
+
+            for code, transform, num_notes, tokens in found:
+                match_timestamps, match_dts, valid = self.check_speeds(
+                    secs, tokens, num_notes, min_dt, max_dt, tol
+                )
+                positions.append(token_positions[tokens[valid]])
+                pattern_codes.append(np.full(valid.sum(), code))
+                transforms.append(np.full(valid.sum(), transform))
+                timestamps.append(match_timestamps[valid])
+                dts.append(match_dts[valid])
+
+        # Order the matches by chart and then by pattern, keeping the
+        # order in which they were found.
+        positions = np.concatenate([np.zeros(0, dtype=np.int64)] + positions)
+        pattern_codes = np.concatenate([np.zeros(0, dtype=np.int64)] + pattern_codes)
+        order = np.lexsort((pattern_codes, positions))
+        matches = pd.DataFrame(
+            {
+                "chart_id": chart_ids[positions[order]],
+                "pattern": pd.Categorical.from_codes(
+                    pattern_codes[order], categories=step_patterns
+                ),
+                "timestamp": np.concatenate([np.zeros(0)] + timestamps)[order],
+                "dt": np.concatenate([np.zeros(0)] + dts)[order],
+            }
+        )
+        if repeat:
+            repetitions = np.concatenate([np.zeros(0, dtype=np.int64)] + repetitions)
+            matches["repetitions"] = repetitions[order]
+        if symmetric:
+            transforms = np.concatenate([np.zeros(0, dtype=np.int64)] + transforms)
+            matches["transform"] = pd.Categorical.from_codes(
+                transforms[order], categories=self.transform_names
+            )
+
+        return matches
+
+    def iter_search(
+        self,
+        corpus: pd.DataFrame | CorpusStore,
+        step_patterns: str | list[str],
+        min_dt: float = 0.0,
+        max_dt: float = 1.0,
+        tol: float = 0.01,
+        hold_distinctions: bool = False,
+        backend: str = "regex",
+        limit: int | None = None,
+        first_per_chart: bool = False,
+        timeout: float | None = None,
+    ) -> Iterator[tuple]:
+        """
+        Search the charts of a corpus for step patterns one chart at a
+        time, yielding matches as they are found.
+
+        The matches are those which search_corpus finds, but a chart is
+        only read when the matches of the charts before it have been
+        consumed, so scanning stops as soon as the limit is reached, the
+        timeout expires, or the caller stops iterating.
+
+        Arguments
+        ---------
+        corpus : pd.DataFrame | CorpusStore
+            A data frame with the 'Step Type' and 'Steps' columns of the
+            data produced by ssc_crawler, or a CorpusStore.
+        step_patterns : str | list[str]
+            A step pattern or a list of step patterns to search for.
+        min_dt : float
+            The minimum time differential between steps in the pattern.
+        max_dt : float
+            The maximum time differential between steps in the pattern.
+        tol : float
+            A tolerance parameter controlling how close the time
+            differentials between steps need to be to the input range.
+        hold_distinctions : bool
+            If true, the caps/tails/interiors of holds will be
+            distinguished for searching.
+        backend : str
+            The search engine to use, 'regex', 'token', or 'automaton',
+            as in search.
+        limit : int | None
+            The maximum number of matches to yield, or None for no
+            limit.
+        first_per_chart : bool
+            If true, only the first match of each chart is yielded.
+        timeout : float | None
+            The number of seconds after which no further charts are
+            scanned, or None for no timeout. The search then ends
+            without an error. The timeout is only checked before each
+            chart is scanned, so the chart being scanned when it expires
+            is still scanned for every pattern and its matches yielded.
+
+        Yields
+        ------
+        match : tuple
+            The chart id, the pattern, the timestamp at which the match
+            begins, and the time difference between consecutive steps.
+            The matches of a chart are yielded in order of position, and
+            matches at the same position in the order of the input
+            patterns, each pattern before its mirror image.
+        """
+        if backend not in ["regex", "token", "automaton"]:
+            raise ValueError(f"Unknown search backend {backend}.")
+        if isinstance(step_patterns, str):
+            step_patterns = [step_patterns]
+        step_patterns = list(dict.fromkeys(step_patterns))
+        chart_ids, step_types = self.corpus_charts(corpus)
+        if limit is not None and limit <= 0:
+            return
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        count = 0
+        for position, chart_id in enumerate(chart_ids.tolist()):
+            if deadline is not None and time.monotonic() > deadline:
+                return
+            secs, _, found = self.scan_matches(
+                corpus,
+                np.array([position]),
+                step_types[position],
+                step_patterns,
+                hold_distinctions,
+                backend,
+            )
+
+            # Merge the matches of every pattern and mirror image by the
+            # token at which they begin.
+            tokens, pattern_codes, timestamps, dts = [], [], [], []
+            for code, _, num_notes, pattern_tokens in found:
+                match_timestamps, match_dts, valid = self.check_speeds(
+                    secs, pattern_tokens, num_notes, min_dt, max_dt, tol
+                )
+                tokens.append(pattern_tokens[valid])
+                pattern_codes.append(np.full(valid.sum(), code))
+                timestamps.append(match_timestamps[valid])
+                dts.append(match_dts[valid])
+            empty = np.zeros(0, dtype=np.int64)
+            tokens = np.concatenate([empty] + tokens)
+            pattern_codes = np.concatenate([empty] + pattern_codes)
+            order = np.lexsort((pattern_codes, tokens))
+            if first_per_chart:
+                order = order[:1]
+
+            timestamps = np.concatenate([np.zeros(0)] + timestamps)[order].tolist()
+            dts = np.concatenate([np.zeros(0)] + dts)[order].tolist()
+            for code, timestamp, dt in zip(pattern_codes[order], timestamps, dts):
+                yield chart_id, step_patterns[code], timestamp, dt
+                count += 1
+                if count == limit:
+                    return
+
+    def count_corpus(
+        self,
+        corpus: pd.DataFrame | CorpusStore,
+        step_patterns: str | list[str],
+        min_dt: float = 0.0,
+        max_dt: float = 1.0,
+        tol: float = 0.01,
+        hold_distinctions: bool = False,
+        backend: str = "regex",
+        index: NGramIndex | None = None,
+        dt_bins: list[float] | None = None,
+    ) -> pd.DataFrame:
+        """
+        Count the matches of step patterns in every chart of a corpus.
+
+        The matches counted are those which search_corpus finds, but
+        they are counted as they are found, without building a row for
+        each match.
+
+        Arguments
+        ---------
+        corpus : pd.DataFrame | CorpusStore
+            A data frame with the 'Step Type' and 'Steps' columns of the
+            data produced by ssc_crawler, or a CorpusStore.
+        step_patterns : str | list[str]
+            A step pattern or a list of step patterns to search for.
+        min_dt : float
+            The minimum time differential between steps in the pattern.
+        max_dt : float
+            The maximum time differential between steps in the pattern.
+        tol : float
+            A tolerance parameter controlling how close the time
+            differentials between steps need to be to the input range.
+        hold_distinctions : bool
+            If true, the caps/tails/interiors of holds will be
+            distinguished for searching.
+        backend : str
+            The search engine to use, 'regex', 'token', or 'automaton',
+            as in search_corpus.
+        index : NGramIndex | None
+            An index of the charts of the corpus, used as in
+            search_corpus, or None.
+        dt_bins : list[float] | None
+            If given, the increasing edges of buckets of the time
+            difference between consecutive steps, and matches are
+            counted in each bucket. A bucket includes its left edge but
+            not its right edge, and matches outside every bucket are not
+            counted.
+
+        Returns
+        -------
+        counts : pd.DataFrame
+            A data frame indexed by chart id with a column giving the
+            number of matches of each pattern in each chart, including
+            the charts without a match. If dt_bins is given, the columns
+            are indexed by the pattern and the bucket.
+        """
+        if isinstance(step_patterns, str):
+            step_patterns = [step_patterns]
+        step_patterns = list(dict.fromkeys(step_patterns))
+        chart_ids, step_types = self.corpus_charts(corpus)
+        num_buckets = 1 if dt_bins is None else len(dt_bins) - 1
+
+        counts = np.zeros((len(chart_ids), len(step_patterns), num_buckets), dtype=int)
+        for selected, chart_counts, _ in self.corpus_counts(
+            corpus,
+            step_patterns,
+            min_dt,
+            max_dt,
+            tol,
+            hold_distinctions,
+            backend,
+            index,
+            dt_bins,
+        ):
+            counts[selected] = chart_counts
+
+        if dt_bins is None:
+            columns = pd.Index(step_patterns)
+        else:
+            buckets = pd.IntervalIndex.from_breaks(dt_bins, closed="left")
+            columns = pd.MultiIndex.from_product([step_patterns, buckets])
+
+        return pd.DataFrame(
+            counts.reshape(len(chart_ids), -1),
+            index=pd.Index(chart_ids, name="chart_id"),
+            columns=columns,
+        )
+
+    def top_charts(
+        self,
+        corpus: pd.DataFrame | CorpusStore,
+        step_patterns: str | list[str],
+        k: int = 10,
+        by: str = "count",
+        min_dt: float = 0.0,
+        max_dt: float = 1.0,
+        tol: float = 0.01,
+        hold_distinctions: bool = False,
+        backend: str = "regex",
+        index: NGramIndex | None = None,
+    ) -> pd.DataFrame:
+        """
+        Find the charts of a corpus with the most matches of step
+        patterns.
+
+        Matches are counted as in count_corpus, summed over the
+        patterns, and the best charts are kept in a heap of size k as
+        the corpus is searched, so the counts of the whole corpus are
+        never stored.
+
+        Arguments
+        ---------
+        corpus : pd.DataFrame | CorpusStore
+            A data frame with the 'Step Type' and 'Steps' columns of the
+            data produced by ssc_crawler, or a CorpusStore.
+        step_patterns : str | list[str]
+            A step pattern or a list of step patterns to search for.
+        k : int
+            The number of charts to return.
+        by : str
+            Equal to 'count' to rank charts by their number of matches,
+            or 'density' to rank them by their number of matches per row
+            of steps.
+        min_dt : float
+            The minimum time differential between steps in the pattern.
+        max_dt : float
+            The maximum time differential between steps in the pattern.
+        tol : float
+            A tolerance parameter controlling how close the time
+            differentials between steps need to be to the input range.
+        hold_distinctions : bool
+            If true, the caps/tails/interiors of holds will be
+            distinguished for searching.
+        backend : str
+            The search engine to use, 'regex', 'token', or 'automaton',
+            as in search_corpus.
+        index : NGramIndex | None
+            An index of the charts of the corpus, used as in
+            search_corpus, or None.
+
+        Returns
+        -------
+        charts : pd.DataFrame
+            A data frame with the chart id, number of matches, and
+            density of matches of at most k charts containing a match,
+            from best to worst. Ties are broken in favour of the chart
+            which comes first in the corpus.
+        """
+        if by not in ["count", "density"]:
+            raise ValueError(f"Unknown ranking {by}.")
+        if isinstance(step_patterns, str):
+            step_patterns = [step_patterns]
+        step_patterns = list(dict.fromkeys(step_patterns))
+        chart_ids, _ = self.corpus_charts(corpus)
+
+        # Keep the best charts found so far, the worst at the top of the
+        # heap. Later charts lose ties, so positions are negated.
+        heap = []
+        for selected, chart_counts, lengths in self.corpus_counts(
+            corpus,
+            step_patterns,
+            min_dt,
+            max_dt,
+            tol,
+            hold_distinctions,
+            backend,
+            index,
+        ):
+            totals = chart_counts.sum(axis=(1, 2))
+            densities = totals / np.maximum(lengths, 1)
+            scores = totals if by == "count" else densities
+            for i in np.flatnonzero(totals > 0).tolist():
+                item = (
+                    scores[i].item(),
+                    -selected[i].item(),
+                    totals[i].item(),
+                    densities[i].item(),
+                )
+                if len(heap) < k:
+                    heapq.heappush(heap, item)
+                elif k > 0:
+                    heapq.heappushpop(heap, item)
+
+        heap.sort(reverse=True)
+        _, positions, totals, densities = zip(*heap) if heap else ([], [], [], [])
+
+        return pd.DataFrame(
+            {
+                "chart_id": chart_ids[-np.array(positions, dtype=np.int64)],
+                "count": np.array(totals, dtype=int),
+                "density": np.array(densities, dtype=float),
+            }
+        )
+
+    def corpus_counts(
+        self,
+        corpus: pd.DataFrame | CorpusStore,
+        step_patterns: list[str],
+        min_dt: float,
+        max_dt: float,
+        tol: float,
+        hold_distinctions: bool,
+        backend: str,
+        index: NGramIndex | None,
+        dt_bins: list[float] | None = None,
+    ) -> Iterator[tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """
+        Count the matches of step patterns in the charts of a corpus,
+        one step type at a time.
+
+        Arguments
+        ---------
+        corpus : pd.DataFrame | CorpusStore
+            A data frame with 'Step Type' and 'Steps' columns, or a
+            CorpusStore.
+        step_patterns : list[str]
+            The step patterns to search for.
+        min_dt : float
+            The minimum time differential between steps in the pattern.
+        max_dt : float
+            The maximum time differential between steps in the pattern.
+        tol : float
+            A tolerance parameter controlling how close the time
+            differentials between steps need to be to the input range.
+        hold_distinctions : bool
+            If true, the caps/tails/interiors of holds will be
+            distinguished for searching.
+        backend : str
+            The search engine to use, 'regex', 'token', or 'automaton'.
+        index : NGramIndex | None
+            An index of the charts of the corpus, or None.
+        dt_bins : list[float] | None
+            The edges of the buckets of time differences in which to
+            count matches, or None to count all matches together.
+
+        Yields
+        ------
+        selected : np.ndarray
+            The positions in the corpus of the charts of a step type.
+        counts : np.ndarray
+            An array with a row for each chart, a column for each
+            pattern, and a slice for each bucket, giving the number of
+            matches.
+        lengths : np.ndarray
+            The number of rows of steps of each chart, or 0 for charts
+            which were not read because they contain no match.
+        """
+        if backend not in ["regex", "token", "automaton"]:
+            raise ValueError(f"Unknown search backend {backend}.")
+        chart_ids, step_types = self.corpus_charts(corpus)
+        num_buckets = 1 if dt_bins is None else len(dt_bins) - 1
+
+        for step_type in np.unique(step_types):
+            selected = np.flatnonzero(step_types == step_type)
+            if index is not None:
+                secs, token_positions, found = self.index_matches(
+                    corpus, selected, step_type, step_patterns, hold_distinctions, index
+                )
+            else:
+                secs, token_positions, found = self.scan_matches(
+                    corpus,
+                    selected,
+                    step_type,
+                    step_patterns,
+                    hold_distinctions,
+                    backend,
+                )
+
+            # Count each valid match in the slot of its chart, pattern,
+            # and bucket.
+            rows = np.searchsorted(selected, token_positions)
+            slots = [np.zeros(0, dtype=np.int64)]
+            for code, _, num_notes, tokens in found:
+                _, match_dts, valid = self.check_speeds(
+                    secs, tokens, num_notes, min_dt, max_dt, tol
+                )
+                buckets = np.zeros(valid.sum(), dtype=np.int64)
+                if dt_bins is not None:
+                    buckets = np.searchsorted(dt_bins, match_dts[valid], "right") - 1
+                inside = (buckets >= 0) & (buckets < num_buckets)
+                chart_rows = rows[tokens[valid][inside]]
+                slots.append(
+                    (chart_rows * len(step_patterns) + code) * num_buckets
+                    + buckets[inside]
+                )
+            size = len(selected) * len(step_patterns) * num_buckets
+            counts = np.bincount(np.concatenate(slots), minlength=size)
+            lengths = np.bincount(rows, minlength=len(selected))
+
+            yield (
+                selected,
+                counts.reshape(len(selected), len(step_patterns), num_buckets),
+                lengths,
+            )
+
+    def scan_matches(
+        self,
+        corpus: pd.DataFrame | CorpusStore,
+        selected: np.ndarray,
+        step_type: str,
+        step_patterns: list[str],
+        hold_distinctions: bool,
+        backend: str,
+        symmetric: bool = False,
+    ) -> tuple[np.ndarray, np.ndarray, list[tuple]]:
+        """
+        Find possible matches of step patterns by scanning the charts of
+        a step type.
+
+        Arguments
+        ---------
+        corpus : pd.DataFrame | CorpusStore
+            A data frame with 'Step Type' and 'Steps' columns, or a
+            CorpusStore.
+        selected : np.ndarray
+            The positions of the charts of the step type in the corpus.
+        step_type : str
+            Equal to 'S' if the charts are singles charts or 'D' if the
+            charts are doubles charts.
+        step_patterns : list[str]
+            The step patterns to search for.
+        hold_distinctions : bool
+            If true, the caps/tails/interiors of holds will be
+            distinguished for searching.
+        backend : str
+            The search engine to use, 'regex', 'token', or 'automaton'.
+            The regex backend cannot be used with symmetric.
+        symmetric : bool
+            If true, the images of each pattern under every symmetry of
+            the pad will be searched for, rather than the pattern and its
+            mirror image.
+
+        Returns
+        -------
+        secs : np.ndarray
+            The timestamp of each token of the charts in seconds.
+        token_positions : np.ndarray
+            The position in the corpus of the chart of each token.
+        found : list[tuple]
+            The index of the step pattern, the index of the transform,
+            the number of notes, and the token at which each possible
+            match begins, for each variant returned by
+            get_pattern_variants.
+        """
+        if backend in ["token", "automaton"]:
+            events, offsets = self.chart_events(corpus, selected)
+            if backend == "automaton":
+                matcher = PatternAutomaton(events, offsets)
+            else:
+                matcher = TokenMatcher(events, offsets)
+            secs = events["ms"] / 1000
+        else:
+            text, token_starts, colons, _, offsets = self.deserializer.tokenize(
+                self.chart_texts(corpus, selected)
+            )
+            try:
+                ms, _ = self.deserializer.parse_timestamps(text, token_starts, colons)
+                secs = ms / 1000
+            except ValueError:
+                # Read timestamps which are not written as serialize_steps
+                # writes them with float, as search reads them.
+                secs = self.deserializer.parse_float_timestamps(
+                    text, token_starts, colons
+                )
+            text = text.tobytes().decode("ascii")
+        token_positions = np.repeat(selected, np.diff(offsets))
+
+        found, pattern_list = [], []
+        for code, step_pattern in enumerate(step_patterns):
+            num_notes = len(step_pattern.split("-"))
+            for transform, pattern in self.get_pattern_variants(
+                step_pattern, step_type, symmetric
+            ):
+                note_patterns = self.get_note_patterns(pattern, hold_distinctions)
+                if backend == "automaton":
+                    pattern_list.append(note_patterns)
+                    tokens = None
+                elif backend == "token":
+                    tokens = matcher.match(note_patterns)
+                else:
+                    regex = self.get_compiled_patterns(
+                        step_pattern, step_type, hold_distinctions
+                    )[transform]
+                    starts = np.fromiter(
+                        (match.start() for match in regex.finditer(text)),
+                        dtype=np.int64,
+                    )
+                    tokens = np.searchsorted(token_starts, starts, side="right") - 1
+                found.append((code, transform, num_notes, tokens))
+
+        # Find the matches of all patterns in one pass.
+        if backend == "automaton":
+            tokens_list = matcher.match_all(pattern_list)
+            found = [
+                (code, transform, num_notes, tokens)
+                for (code, transform, num_notes, _), tokens in zip(found, tokens_list)
+            ]
+
+        return secs, token_positions, found
+
+    def index_matches(
+        self,
+        corpus: pd.DataFrame | CorpusStore,
+        selected: np.ndarray,
+        step_type: str,
+        step_patterns: list[str],
+        hold_distinctions: bool,
+        index: NGramIndex,
+        symmetric: bool = False,
+    ) -> tuple[np.ndarray, np.ndarray, list[tuple]]:
+        """
+        Find possible matches of step patterns in the charts of a step
+        type by looking them up in an index.
+
+        Only the charts containing a possible match are read.
+
+        Arguments
+        ---------
+        corpus : pd.DataFrame | CorpusStore
+            A data frame with 'Step Type' and 'Steps' columns, or a
+            CorpusStore.
+        selected : np.ndarray
+            The positions of the charts of the step type in the corpus.
+        step_type : str
+            Equal to 'S' if the charts are singles charts or 'D' if the
+            charts are doubles charts.
+        step_patterns : list[str]
+            The step patterns to search for.
+        hold_distinctions : bool
+            If true, the caps/tails/interiors of holds will be
+            distinguished for searching.
+        index : NGramIndex
+            An index of the charts of the corpus.
+        symmetric : bool
+            If true, the images of each pattern under every symmetry of
+            the pad will be searched for, rather than the pattern and its
+            mirror image.
+
+        Returns
+        -------
+        secs : np.ndarray
+            The timestamp of each token of the charts read in seconds.
+        token_positions : np.ndarray
+            The position in the corpus of the chart of each token read.
+        found : list[tuple]
+            The index of the step pattern, the index of the transform,
+            the number of notes, and the token at which each possible
+            match begins, for each variant returned by
+            get_pattern_variants.
+        """
+        chart_ids, _ = self.corpus_charts(corpus)
+        chart_ids = pd.Index(chart_ids)
+
+        # Look up the charts and events of the matches of each pattern.
+        found = []
+        for code, step_pattern in enumerate(step_patterns):
+            for transform, pattern in self.get_pattern_variants(
+                step_pattern, step_type, symmetric
+            ):
+                note_patterns = self.get_note_patterns(pattern, hold_distinctions)
+                ids, starts = index.match(note_patterns, step_type)
+                charts = chart_ids.get_indexer(ids)
+                kept = np.isin(charts, selected)
+                found.append(
+                    (code, transform, len(note_patterns), charts[kept], starts[kept])
+                )
+
+        # Read the charts containing a match.
+        charts = np.unique(
+            np.concatenate([np.zeros(0, dtype=np.int64)] + [f[3] for f in found])
+        )
+        events, offsets = self.chart_events(corpus, charts)
+        token_positions = np.repeat(charts, np.diff(offsets))
+        found = [
+            (code, transform, num_notes, offsets[np.searchsorted(charts, c)] + starts)
+            for code, transform, num_notes, c, starts in found
+        ]
+
+        return events["ms"] / 1000, token_positions, found
+
+    def run_matches(
+        self,
+        corpus: pd.DataFrame | CorpusStore,
+        selected: np.ndarray,
+        step_type: str,
+        step_patterns: list[str],
+        hold_distinctions: bool,
+        min_dt: float,
+        max_dt: float,
+        tol: float,
+        index: NGramIndex | None,
+        symmetric: bool = False,
+    ) -> tuple[np.ndarray, list[tuple]]:
+        """
+        Find the maximal runs of step patterns in the charts of a step
+        type.
+
+        Arguments
+        ---------
+        corpus : pd.DataFrame | CorpusStore
+            A data frame with 'Step Type' and 'Steps' columns, or a
+            CorpusStore.
+        selected : np.ndarray
+            The positions of the charts of the step type in the corpus.
+        step_type : str
+            Equal to 'S' if the charts are singles charts or 'D' if the
+            charts are doubles charts.
+        step_patterns : list[str]
+            The step patterns to search for.
+        hold_distinctions : bool
+            If true, the caps/tails/interiors of holds will be
+            distinguished for searching.
+        min_dt : float
+            The minimum time differential between steps in a run.
+        max_dt : float
+            The maximum time differential between steps in a run.
+        tol : float
+            A tolerance parameter controlling how close the time
+            differentials between steps need to be to the input range.
+        index : NGramIndex | None
+            An index of the charts of the corpus, used to skip the charts
+            without a repetition of any pattern, or None.
+        symmetric : bool
+            If true, the images of each pattern under every symmetry of
+            the pad will be searched for, rather than the pattern and its
+            mirror image.
+
+        Returns
+        -------
+        token_positions : np.ndarray
+            The position in the corpus of the chart of each token read.
+        runs : list[tuple]
+            The index of the step pattern, the index of the transform, the
+            token at which each run begins, and the timestamp, mean time
+            difference, and number of repetitions of each run, for each
+            variant returned by get_pattern_variants.
+        """
+        pattern_list = [
+            (code, transform, self.get_note_patterns(pattern, hold_distinctions))
+            for code, step_pattern in enumerate(step_patterns)
+            for transform, pattern in self.get_pattern_variants(
+                step_pattern, step_type, symmetric
+            )
+        ]
+
+        # Only read the charts containing a repetition of a pattern.
+        if index is not None:
+            chart_ids = pd.Index(self.corpus_charts(corpus)[0])
+            found = [
+                chart_ids.get_indexer(
+                    index.match(note_patterns, step_type, strict=True)[0]
+                )
+                for _, _, note_patterns in pattern_list
+            ]
+            selected = selected[np.isin(selected, np.concatenate([[]] + found))]
+
+        events, offsets = self.chart_events(corpus, selected)
+        detector = RunDetector(events, offsets)
+        runs = []
+        for code, transform, note_patterns in pattern_list:
+            starts, repetitions, dts = detector.runs(note_patterns, min_dt, max_dt, tol)
+            runs.append(
+                (code, transform, starts, detector.times[starts], dts, repetitions)
+            )
+
+        return np.repeat(selected, np.diff(offsets)), runs
+
+    def corpus_charts(
+        self, corpus: pd.DataFrame | CorpusStore
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Get the chart ids and step types of the charts in a corpus.
+
+        Arguments
+        ---------
+        corpus : pd.DataFrame | CorpusStore
+            A data frame with 'Step Type' and 'Steps' columns, or a
+            CorpusStore.
+
+        Returns
+        -------
+        chart_ids : np.ndarray
+            The id of each chart.
+        step_types : np.ndarray
+            The step type of each chart.
+        """
+        if isinstance(corpus, CorpusStore):
+            return corpus.chart_ids, corpus.metadata["Step Type"].values
+
+        return corpus.index.values, corpus["Step Type"].values
+
+    def chart_texts(
+        self, corpus: pd.DataFrame | CorpusStore, selected: np.ndarray
+    ) -> list[str]:
+        """
+        Get the serialized steps of charts in a corpus.
+
+        Arguments
+        ---------
+        corpus : pd.DataFrame | CorpusStore
+            A data frame with 'Step Type' and 'Steps' columns, or a
+            CorpusStore.
+        selected : np.ndarray
+            The positions of the charts in the corpus.
+
+        Returns
+        -------
+        charts : list[str]
+            The serialized steps of each chart.
+        """
+        if isinstance(corpus, CorpusStore):
+            return [
+                self.serializer.events_to_text(corpus.chart_events(i)) for i in selected
+            ]
+
+        return corpus["Steps"].iloc[selected].fillna("").tolist()
+
+    def chart_events(
+        self, corpus: pd.DataFrame | CorpusStore, selected: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Get the events of charts in a corpus.
+
+        Arguments
+        ---------
+        corpus : pd.DataFrame | CorpusStore
+            A data frame with 'Step Type' and 'Steps' columns, or a
+            CorpusStore.
+        selected : np.ndarray
+            The positions of the charts in the corpus.
+
+        Returns
+        -------
+        events : np.ndarray
+            An array with dtype StepSerializer.event_dtype containing the
+            events of the charts back to back.
+        offsets : np.ndarray
+            An array containing the index of the first event of each
+            chart followed by the total number of events.
+        """
+        if isinstance(corpus, CorpusStore):
+            starts = np.asarray(corpus.starts[selected], dtype=np.int64)
+            ends = np.asarray(corpus.ends[selected], dtype=np.int64)
+            positions, _ = StepDeserializer.segment_positions(starts, ends)
+            offsets = np.concatenate([[0], np.cumsum(ends - starts)])
+            return corpus.events[positions], offsets
+
+        return self.deserializer.deserialize_column(self.chart_texts(corpus, selected))
+
+    def check_speeds(
+        self,
+        secs: np.ndarray,
+        tokens: np.ndarray,
+        num_notes: int,
+        min_dt: float,
+        max_dt: float,
+        tol: float,
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Check the speed constraints of possible matches as search does.
+
+        As in search, the timestamp of a match is read without its sign,
+        and a time differential is only checked against the previous
+        one if the previous one is not negative.
+
+        Arguments
+        ---------
+        secs : np.ndarray
+            The timestamp of each token in seconds.
+        tokens : np.ndarray
+            The token at which each possible match begins.
+        num_notes : int
+            The number of notes in the step pattern.
+        min_dt : float
+            The minimum time differential between steps in the pattern.
+        max_dt : float
+            The maximum time differential between steps in the pattern.
+        tol : float
+            A tolerance parameter controlling how close the time
+            differentials between steps need to be to the input range.
+
+        Returns
+        -------
+        timestamps : np.ndarray
+            The timestamp at which each possible match begins.
+        dts : np.ndarray
+            The last time differential of each possible match.
+        valid : np.ndarray
+            A boolean array which is true for matches satisfying the
+            speed constraints.
+        """
+        times = np.abs(secs[tokens[:, None] + np.arange(num_notes)])
+        if num_notes == 1:
+            return times[:, 0], np.zeros(len(tokens)), np.ones(len(tokens), dtype=bool)
+
+        dts = np.diff(times, axis=1)
+        previous, current = dts[:, :-1], dts[:, 1:]
+        invalid = (previous >= 0) & (
+            (np.abs(current - previous) > tol)
+            | (current < min_dt - tol)
+            | (current > max_dt + tol)
+        )
+
+        return times[:, 0], dts[:, -1], ~invalid.any(axis=1)
@@ -30,6 +30,18 @@ class StepSerializer:
         "S": [f"hold_duration_{panel}" for panel in panels["S"]],
         "D": [f"hold_duration_{panel}" for panel in panels["D"]],
     }
+    step_strings = {"S": dict(), "D": dict()}  # This maps step keys to strings.
+    step_masks = dict()  # This maps step strings to bitmasks.
+    event_dtype = np.dtype(  # This stores a row of steps in 12 bytes.
+        [
+            ("ms", "<i4"),
+            ("taps", "<u2"),
+            ("hold_caps", "<u2"),
+            ("hold_interiors", "<u2"),
+            ("hold_tails", "<u2"),
+        ]
+    )
+    negative_zero = 1 << 15  # This flag in 'taps' marks a timestamp of -0.0.
 
     def serialize_steps(self, step_type: str, chart_df: pd.DataFrame) -> str:
         """
@@ -61,52 +73,477 @@ class StepSerializer:
             A string containing hypen-separated components which
             indicate a step together with the time at which it occurs.
         """
-        # Isolate tap notes and hold caps/tails.
-        taps = chart_df.loc[:, self.tap_cols[step_type]].sum(axis=1)
-        hold_caps = chart_df.loc[:, self.hold_cols[step_type]].sum(axis=1)
-        hold_tails = chart_df.loc[:, self.hold_dur_cols[step_type]] == 0
-        sel = (taps > 0) | (hold_caps > 0) | hold_tails.any(axis=1)
-        cols = (
-            ["sec"]
-            + self.tap_cols[step_type]
-            + self.hold_cols[step_type]
-            + self.hold_dur_cols[step_type]
-        )
-        df = chart_df.loc[sel, cols]
+        # Get the step columns as 2D arrays.
+        taps, hold_caps, hold_durations = [
+            np.column_stack([chart_df[col].to_numpy() for col in cols])
+            for cols in [
+                self.tap_cols[step_type],
+                self.hold_cols[step_type],
+                self.hold_dur_cols[step_type],
+            ]
+        ]
+        secs = chart_df["sec"].to_numpy()
 
-        # Convert the step columns to strings.
-        taps = df.loc[:, self.tap_cols[step_type]].apply(
-            lambda col: np.char.multiply(col.name.split("_")[-1], col.astype(int))
-        )
-        hold_caps = df.loc[:, self.hold_cols[step_type]].apply(
-            lambda col: np.char.multiply(
-                f'{col.name.split("_")[-1].lower()}1', col.astype(int)
-            )
+        return self.serialize_arrays(step_type, secs, taps, hold_caps, hold_durations)
+
+    def serialize_arrays(
+        self,
+        step_type: str,
+        secs: np.ndarray,
+        taps: np.ndarray,
+        hold_caps: np.ndarray,
+        hold_durations: np.ndarray,
+    ) -> str:
+        """
+        Serialize the steps of a stepchart given as arrays.
+
+        Arguments
+        ---------
+        step_type : str
+            Equal to 'S' if the chart is a singles chart or 'D' if the
+            chart is a doubles chart.
+        secs : np.ndarray
+            The second at which each row of the chart occurs.
+        taps : np.ndarray
+            A 2D array of the number of taps on each panel in each row.
+        hold_caps : np.ndarray
+            A 2D array of the number of hold caps on each panel in each
+            row.
+        hold_durations : np.ndarray
+            A 2D array of the remaining hold duration on each panel in
+            each row, or NaN if no hold is active.
+
+        Returns
+        -------
+        steps: str
+            A string containing hypen-separated components which
+            indicate a step together with the time at which it occurs.
+        """
+        tokens = self.step_tokens(step_type, secs, taps, hold_caps, hold_durations)[1]
+        steps = "-".join(tokens)
+
+        return steps
+
+    def serialize_charts(
+        self, charts: list[pd.DataFrame | dict] | pd.DataFrame
+    ) -> list[str]:
+        """
+        Serialize the steps of many stepcharts at once.
+
+        The rows of all charts are combined and serialized together, so
+        the fixed cost of serializing a chart is paid once per batch.
+        Singles and doubles charts may be mixed, as the panels of each
+        chart are taken from its columns.
+
+        Arguments
+        ---------
+        charts : list[pd.DataFrame | dict] | pd.DataFrame
+            Either a list of data frames produced by the chart_to_df
+            method of the Stepchart class, or of dictionaries with the
+            same columns, or one data frame stacking such data frames
+            with a 'chart_id' column identifying the chart of each row.
+
+        Returns
+        -------
+        steps : list[str]
+            The serialized steps of each chart, in the order of the
+            list, or in order of first appearance of each chart id.
+        """
+        if isinstance(charts, pd.DataFrame):
+            codes, chart_ids = pd.factorize(charts["chart_id"])
+            num_charts = len(chart_ids)
+            order = np.argsort(codes, kind="stable")
+            arrays = [array[order] for array in self.chart_arrays(charts)]
+            chart_idx = codes[order]
+        else:
+            num_charts = len(charts)
+            if num_charts == 0:
+                return []
+            arrays = [self.chart_arrays(chart) for chart in charts]
+            rows = [len(chart_arrays[0]) for chart_arrays in arrays]
+            arrays = [np.concatenate(array) for array in zip(*arrays)]
+            chart_idx = np.repeat(np.arange(num_charts), rows)
+
+        # Serialize all rows, then split the tokens between charts.
+        sel, tokens = self.step_tokens("D", *arrays)
+        counts = np.bincount(chart_idx[sel], minlength=num_charts)
+        ends = np.cumsum(counts).tolist()
+        steps = [
+            "-".join(tokens[end - count : end])
+            for count, end in zip(counts.tolist(), ends)
+        ]
+
+        return steps
+
+    def chart_arrays(self, chart) -> list[np.ndarray]:
+        """
+        Get the seconds and step columns of a chart as arrays.
+
+        Arguments
+        ---------
+        chart : pd.DataFrame | dict
+            A data frame produced by the chart_to_df method of the
+            Stepchart class, or a dictionary with the same columns.
+
+        Returns
+        -------
+        arrays : list[np.ndarray]
+            The seconds of each row, followed by 2D arrays of taps, hold
+            caps, and hold durations with a column for each doubles
+            panel. Panels missing from the chart, or null in a stacked
+            data frame, have no steps.
+        """
+        secs = np.asarray(chart["sec"], dtype=float)
+        arrays = [secs]
+        for cols, fill in [
+            (self.tap_cols["D"], 0),
+            (self.hold_cols["D"], 0),
+            (self.hold_dur_cols["D"], np.nan),
+        ]:
+            array = np.full((len(secs), len(cols)), fill, dtype=float)
+            for i, col in enumerate(cols):
+                if col in chart:
+                    array[:, i] = chart[col]
+            array[np.isnan(array)] = fill
+            arrays.append(array)
+
+        return arrays
+
+    def step_tokens(
+        self,
+        step_type: str,
+        secs: np.ndarray,
+        taps: np.ndarray,
+        hold_caps: np.ndarray,
+        hold_durations: np.ndarray,
+    ) -> tuple[np.ndarray, list[str]]:
+        """
+        Get the serialized token of each row with steps.
+
+        The steps of each row are packed into integer bitmasks of the
+        panels with taps, hold caps, hold interiors, and hold tails.
+        Each distinct combination of masks is converted to a string
+        once, using a lookup table shared by all charts, so the cost of
+        building strings does not grow with the length of the chart.
+        Rows with more than one tap or cap on a panel are rare and are
+        converted individually.
+
+        Arguments
+        ---------
+        step_type : str
+            Equal to 'S' if the chart is a singles chart or 'D' if the
+            chart is a doubles chart.
+        secs : np.ndarray
+            The second at which each row occurs.
+        taps : np.ndarray
+            A 2D array of the number of taps on each panel in each row.
+        hold_caps : np.ndarray
+            A 2D array of the number of hold caps on each panel in each
+            row.
+        hold_durations : np.ndarray
+            A 2D array of the remaining hold duration on each panel in
+            each row, or NaN if no hold is active.
+
+        Returns
+        -------
+        sel : np.ndarray
+            A boolean array which is true for rows with steps.
+        tokens : list[str]
+            The timestamp and steps of each row with steps.
+        """
+        sel, taps, hold_caps, hold_interiors, hold_tails = self.row_steps(
+            taps, hold_caps, hold_durations
         )
-        hold_interiors = df.loc[:, self.hold_dur_cols[step_type]].apply(
-            lambda col: np.char.multiply(
-                col.name.split("_")[-1].lower(),
-                ((col > 0) * (df[f"hold_{col.name[-1]}"] == 0)).astype(int),
+        keys = self.step_keys(taps, hold_caps, hold_interiors, hold_tails)
+        strings = self.key_strings(step_type, keys)
+
+        # Convert rows with repeated taps or caps on a panel directly.
+        repeated = np.flatnonzero((taps > 1).any(axis=1) | (hold_caps > 1).any(axis=1))
+        for row in repeated:
+            strings[row] = self.step_string(
+                step_type,
+                taps[row],
+                hold_caps[row],
+                hold_interiors[row],
+                hold_tails[row],
             )
+
+        # Get the string representation of the steps.
+        timestamps = np.round(secs[sel], 3).astype(str)
+        tokens = [f"{sec}:{step}" for sec, step in zip(timestamps, strings)]
+
+        return sel, tokens
+
+    def row_steps(
+        self, taps: np.ndarray, hold_caps: np.ndarray, hold_durations: np.ndarray
+    ) -> tuple:
+        """
+        Find the rows with steps and the steps on each panel in them.
+
+        Arguments
+        ---------
+        taps : np.ndarray
+            A 2D array of the number of taps on each panel in each row.
+        hold_caps : np.ndarray
+            A 2D array of the number of hold caps on each panel in each
+            row.
+        hold_durations : np.ndarray
+            A 2D array of the remaining hold duration on each panel in
+            each row, or NaN if no hold is active.
+
+        Returns
+        -------
+        sel : np.ndarray
+            A boolean array which is true for rows with steps.
+        taps : np.ndarray
+            The number of taps on each panel in each selected row.
+        hold_caps : np.ndarray
+            The number of hold caps on each panel in each selected row.
+        hold_interiors : np.ndarray
+            A boolean array which is true where a hold continues.
+        hold_tails : np.ndarray
+            A boolean array which is true where a hold ends.
+        """
+        # Isolate tap notes and hold caps/tails.
+        hold_tails = hold_durations == 0
+        sel = (taps.sum(axis=1) > 0) | (hold_caps.sum(axis=1) > 0)
+        sel |= hold_tails.any(axis=1)
+        taps = taps[sel].astype(int)
+        hold_caps = hold_caps[sel].astype(int)
+        hold_interiors = (hold_durations[sel] > 0) & (hold_caps == 0)
+        hold_tails = hold_tails[sel]
+
+        return sel, taps, hold_caps, hold_interiors, hold_tails
+
+    def step_keys(
+        self,
+        taps: np.ndarray,
+        hold_caps: np.ndarray,
+        hold_interiors: np.ndarray,
+        hold_tails: np.ndarray,
+    ) -> np.ndarray:
+        """
+        Pack the steps of each row into an integer key.
+
+        Bits 0-9, 10-19, 20-29, and 30-39 of a key are the panels with
+        taps, hold caps, hold interiors, and hold tails respectively.
+
+        Arguments
+        ---------
+        taps : np.ndarray
+            A 2D array whose nonzero values mark taps.
+        hold_caps : np.ndarray
+            A 2D array whose nonzero values mark hold caps.
+        hold_interiors : np.ndarray
+            A 2D array whose nonzero values mark hold interiors.
+        hold_tails : np.ndarray
+            A 2D array whose nonzero values mark hold tails.
+
+        Returns
+        -------
+        keys : np.ndarray
+            The key of each row.
+        """
+        weights = 1 << np.arange(taps.shape[1], dtype=np.int64)
+        keys = (taps > 0) @ weights
+        for shift, steps in [(10, hold_caps), (20, hold_interiors), (30, hold_tails)]:
+            keys |= ((steps > 0) @ weights) << shift
+
+        return keys
+
+    def key_strings(self, step_type: str, keys: np.ndarray) -> np.ndarray:
+        """
+        Get the string of the steps of each key from the lookup table.
+
+        Arguments
+        ---------
+        step_type : str
+            Equal to 'S' if the chart is a singles chart or 'D' if the
+            chart is a doubles chart.
+        keys : np.ndarray
+            An array of keys produced by step_keys.
+
+        Returns
+        -------
+        strings : np.ndarray
+            An object array of the step strings of the keys.
+        """
+        table = self.step_strings[step_type]
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        strings = []
+        for key in unique_keys.tolist():
+            if key not in table:
+                table[key] = self.step_string(
+                    step_type,
+                    *[(key >> shift) & 0x3FF for shift in range(0, 40, 10)],
+                )
+            strings.append(table[key])
+
+        return np.array(strings, dtype=object)[inverse]
+
+    def step_string(
+        self, step_type: str, taps, hold_caps, hold_interiors, hold_tails
+    ) -> str:
+        """
+        Return the string representing the steps of a row.
+
+        Each argument after the step type is either an integer bitmask
+        of panels or a sequence giving the number of steps on each
+        panel.
+
+        Arguments
+        ---------
+        step_type : str
+            Equal to 'S' if the chart is a singles chart or 'D' if the
+            chart is a doubles chart.
+        taps
+            The taps on each panel.
+        hold_caps
+            The hold caps on each panel.
+        hold_interiors
+            The panels on which a hold continues.
+        hold_tails
+            The panels on which a hold ends.
+
+        Returns
+        -------
+        string : str
+            Taps, hold caps, and the interiors and tails of holds, each
+            listed in panel order.
+        """
+        panels = self.panels[step_type]
+        counts = []
+        for steps in [taps, hold_caps, hold_interiors, hold_tails]:
+            if isinstance(steps, int):
+                steps = [(steps >> i) & 1 for i in range(len(panels))]
+            counts.append([int(count) for count in steps])
+        taps, hold_caps, hold_interiors, hold_tails = counts
+
+        string = "".join(panel * count for panel, count in zip(panels, taps))
+        string += "".join(
+            f"{panel.lower()}1" * count for panel, count in zip(panels, hold_caps)
         )
-        hold_tails = df.loc[:, self.hold_dur_cols[step_type]].apply(
-            lambda col: np.char.multiply(
-                f'{col.name.split("_")[-1].lower()}0', (col == 0).astype(int)
-            )
+        string += "".join(
+            panel.lower() * interior + f"{panel.lower()}0" * tail
+            for panel, interior, tail in zip(panels, hold_interiors, hold_tails)
         )
 
-        # Merge the columns.
-        string_df = pd.concat(
-            [
-                np.round(df["sec"], 3).astype(str) + ":",
-                taps,
-                hold_caps,
-                hold_interiors + hold_tails,
-            ],
-            axis=1,
+        return string
+
+    def serialize_events(self, chart) -> np.ndarray:
+        """
+        Serialize the steps of a stepchart as an array of events.
+
+        Events are a binary form of the text produced by
+        serialize_steps. Each event stores the timestamp of a row in
+        integer milliseconds and the panels with taps, hold caps, hold
+        interiors, and hold tails as bitmasks, with bit i standing for
+        the i-th doubles panel. A timestamp which would be written as
+        -0.0 is marked by the negative_zero flag in 'taps'. Events can
+        be stored with tobytes and loaded with np.frombuffer using
+        event_dtype.
+
+        Arguments
+        ---------
+        chart : pd.DataFrame | dict
+            A data frame produced by the chart_to_df method of the
+            Stepchart class, or a dictionary with the same columns.
+
+        Returns
+        -------
+        events : np.ndarray
+            An array with dtype event_dtype containing an event for
+            each row with steps.
+        """
+        secs, taps, hold_caps, hold_durations = self.chart_arrays(chart)
+        sel, taps, hold_caps, hold_interiors, hold_tails = self.row_steps(
+            taps, hold_caps, hold_durations
         )
+        if (taps > 1).any() or (hold_caps > 1).any():
+            raise ValueError("Events cannot store repeated steps on a panel.")
 
-        # Get the string representation of the steps.
-        steps = "-".join(string_df.sum(axis=1))
+        # Get timestamps in milliseconds, rounded as in serialize_steps.
+        ms = np.rint(secs[sel] * 1000)
+        if (np.abs(ms) >= 2**31).any():
+            raise ValueError("Events cannot store timestamps past 24 days.")
+
+        events = np.zeros(len(ms), dtype=StepSerializer.event_dtype)
+        events["ms"] = ms
+        keys = self.step_keys(taps, hold_caps, hold_interiors, hold_tails)
+        for shift, field in enumerate(StepSerializer.event_dtype.names[1:]):
+            events[field] = (keys >> (10 * shift)) & 0x3FF
+        events["taps"][np.signbit(ms) & (ms == 0)] |= StepSerializer.negative_zero
+
+        return events
+
+    def events_to_text(self, events: np.ndarray) -> str:
+        """
+        Convert an array of events to serialized steps.
+
+        Arguments
+        ---------
+        events : np.ndarray
+            An array with dtype event_dtype.
+
+        Returns
+        -------
+        steps : str
+            The serialized steps, as produced by serialize_steps.
+        """
+        flagged = (events["taps"] & StepSerializer.negative_zero) > 0
+        timestamps = (events["ms"] / 1000).astype(str)
+        timestamps[flagged] = "-0.0"
+
+        # Convert the bitmasks to strings using the lookup table.
+        keys = (events["taps"] & 0x3FF).astype(np.int64)
+        for shift, field in enumerate(StepSerializer.event_dtype.names[2:], start=1):
+            keys |= events[field].astype(np.int64) << (10 * shift)
+        strings = self.key_strings("D", keys)
+        steps = "-".join([f"{sec}:{step}" for sec, step in zip(timestamps, strings)])
 
         return steps
+
+    def parse_step_string(self, string: str) -> tuple[int, int, int, int]:
+        """
+        Get the bitmasks of the panels with each kind of step in a step
+        string.
+
+        Arguments
+        ---------
+        string : str
+            A step string, such as 'Zq1s0'.
+
+        Returns
+        -------
+        masks : tuple[int, int, int, int]
+            Bitmasks of the panels with taps, hold caps, hold
+            interiors, and hold tails.
+        """
+        if string in StepSerializer.step_masks:
+            return StepSerializer.step_masks[string]
+
+        panels = "".join(self.panels["D"])
+        masks = [0, 0, 0, 0]
+        i = 0
+        while i < len(string):
+            panel = panels.find(string[i].upper())
+            if panel < 0:
+                raise ValueError(f"Unknown panel {string[i]} in steps {string}.")
+            suffix = string[i + 1 : i + 2]
+            if string[i].isupper():
+                kind, length = 0, 1
+            elif suffix == "1":
+                kind, length = 1, 2
+            elif suffix == "0":
+                kind, length = 3, 2
+            else:
+                kind, length = 2, 1
+            masks[kind] |= 1 << panel
+            i += length
+
+        # Only strings written by step_string can be converted back.
+        if self.step_string("D", *masks) != string:
+            raise ValueError(f"Steps {string} cannot be stored as an event.")
+        StepSerializer.step_masks[string] = tuple(masks)
+
+        return tuple(masks)
@@ -7,6 +7,8 @@ format.
 from functools import reduce
 import re
 import pandas as pd, numpy as np
+from chart_builder import ChartBuilder
+from timing_map import TimingMap
 
 
 class Stepchart:
@@ -36,6 +38,26 @@ class Stepchart:
         "scrolls": ["beat", "scroll_factor"],
         "fakes": ["beat", "fake"],
     }
+    note_widths = {"pump-single": 5, "pump-halfdouble": 6, "pump-double": 10}
+    line_pattern = re.compile("\n+")
+    # Note lines should match this.
+    note_pattern = re.compile("[0-3F6{nvshLMNVSH|}]*$")
+    stepf2_subs = [  # These replace StepF2 notation, in order.
+        (re.compile(r"{[FM]|[nvsh]\|[0-1]\|[0-1]}"), "0"),
+        (re.compile(r"{[1MFSVH]|[nvsh]\|1\|[0-1]}"), "0"),
+        (re.compile(r"{[1SVHL]|[nvsh]\|0\|[0-1]}"), "1"),
+        (re.compile(r"{2|[nvsh]\|0\|[0-1]}"), "2"),
+        (re.compile(r"{3|[nvsh]\|0\|[0-1]}"), "3"),
+    ]
+    # This replaces lifts and StepF2 holds.
+    note_table = str.maketrans("L6", "12")
+    step_dtype = np.dtype(  # This stores parsed steps compactly.
+        [("panel", "i1"), ("step_type", "i1"), ("beat", "f8"), ("tick", "i8")]
+    )
+    ticks_per_measure = 192  # Ticks are exact for the usual note quantizations.
+    # This maps characters to step types.
+    step_codes = np.full(256, -1, dtype=np.int8)
+    step_codes[[ord(step) for step in step_type_map]] = range(len(step_type_map))
 
     def __init__(
         self, song_title: str, stepchart: str, convert_half_doubles: bool = True
@@ -56,6 +78,7 @@ class Stepchart:
         """
         attributes = stepchart["attributes"]
         self.stepstype = attributes["STEPSTYPE"]
+        self.scanned_notes = None
 
         # Infer the number of panels based on the steptype.
         self.panels = 0
@@ -107,7 +130,114 @@ class Stepchart:
             "scrolls": attributes["SCROLLS"],
             "fakes": attributes.get("FAKES", ""),
         }
-        self.notes = stepchart["notes"]
+        self.stepchart = stepchart
+
+    @property
+    def notes(self) -> str:
+        """
+        The notes section of the stepchart.
+
+        The notes are only accessed when needed, so a lazily parsed
+        stepchart which is excluded by its header attributes never has
+        its notes read.
+        """
+        return self.stepchart["notes"]
+
+    @property
+    def timing(self) -> TimingMap:
+        """
+        The TimingMap used to convert between the beats and seconds of
+        the stepchart.
+
+        Stepcharts with the same timing attributes, such as those
+        using the timing of their song, share one TimingMap.
+        """
+        return TimingMap.from_timing_data(
+            self.timing_data["bpms"],
+            self.timing_data["stops"],
+            self.timing_data["delays"],
+            self.timing_data["warps"],
+            self.offset,
+        )
+
+    def scan_notes(self, notes: str) -> dict:
+        """
+        Validate, normalize, and split the note data in a single pass.
+
+        Each note line is checked against the pattern of standard notes
+        as written. It is then normalized by replacing StepF2 notation,
+        lifts, and StepF2 holds, truncated to the number of panels of
+        the step type, and checked again. The normalized lines are
+        grouped into measures. The result is cached, so the notes are
+        scanned once no matter how many times they are checked or
+        parsed.
+
+        Arguments
+        ---------
+        notes : str
+            A stepchart section from an .ssc file.
+
+        Returns
+        -------
+        scanned_notes : dict
+            A dictionary whose values are a flag indicating whether the
+            note lines as written are standard, the first nonstandard
+            line found, if any, and a list containing the normalized
+            note lines of each measure. The list is None if any
+            normalized line is nonstandard.
+        """
+        # Reuse the result of a previous scan of the same notes.
+        if self.scanned_notes is not None and self.scanned_notes["notes"] is notes:
+            return self.scanned_notes
+
+        panels = Stepchart.note_widths.get(self.stepstype, 0)
+        is_standard = True
+        invalid_note = ""
+        clean_notes = []
+
+        # Check and normalize each note line and remove comments.
+        for note in Stepchart.line_pattern.split(notes.strip()):
+            note = note.strip()
+            if note.startswith("//"):
+                continue
+            # Keep measure-separating lines.
+            elif note.startswith(","):
+                if clean_notes is not None:
+                    clean_notes.append(note)
+                continue
+
+            if not Stepchart.note_pattern.match(note[: self.panels]):
+                is_standard = False
+                invalid_note = note[: self.panels]
+                break
+
+            if clean_notes is not None:
+                # Replace StepF2 notation.
+                if "{" in note or "|" in note:
+                    for pattern, repl in Stepchart.stepf2_subs:
+                        note = pattern.sub(repl, note)
+                note = note.translate(Stepchart.note_table)[:panels]
+
+                # Stop normalizing if a note doesn't match the pattern.
+                if Stepchart.note_pattern.match(note):
+                    clean_notes.append(note)
+                else:
+                    clean_notes = None
+
+        # Split the normalized lines into measures.
+        measures = None
+        if is_standard and clean_notes is not None:
+            measures = "\n".join(clean_notes).split(",")
+            measures = [measure.strip().split("\n") for measure in measures]
+
+        self.scanned_notes = {
+            "notes": notes,
+            "standard": is_standard,
+            "invalid_note": invalid_note,
+            "measures": measures,
+        }
+
+        return self.scanned_notes
 
     def standard_notes(self, notes: str) -> bool:
         """
@@ -129,21 +259,10 @@ class Stepchart:
             True if the stepchart contains only standard notes, false
             otherwise.
         """
-        is_standard = True
-        notes = re.split("\n+", notes.strip())
-        note_pat = "[0-3F6{nvshLMNVSH|}]*$"  # Note lines should match this pattern.
-
-        # Check each note line and remove comments.
-        for note in notes:
-            note = note.strip()
-            if note.startswith("//"):
-                continue
-            elif not note.startswith(","):
-                note = note[: self.panels]
-                if not re.match(note_pat, note):
-                    print(note, self.title)
-                    is_standard = False
-                    break
+        scanned_notes = self.scan_notes(notes)
+        is_standard = scanned_notes["standard"]
+        if not is_standard:
+            print(scanned_notes["invalid_note"], self.title)
 
         return is_standard
 
@@ -168,48 +287,10 @@ class Stepchart:
         if self.panels == 0:
             return []
 
-        notes = re.split("\n+", notes.strip())
-        clean_notes = []
-
-        note_pat = "[0-3F6{nvshLMNVSH|}]*$"  # Note lines should match this pattern.
-
-        # Check each note line and remove comments.
-        for note in notes:
-            note = note.strip()
-            if note.startswith(","):
-                clean_notes.append(note)
-            # Ignore measure-separating lines.
-            elif note.startswith("//"):
-                continue
-
-            else:
-                # Determine the number of panels.
-                if self.stepstype == "pump-single":
-                    panels = 5
-                elif self.stepstype == "pump-halfdouble":
-                    panels = 6
-                elif self.stepstype == "pump-double":
-                    panels = 10
-                else:
-                    panels = 0
-
-                # Replace StepF2 notation.
-                note = re.sub("{[FM]|[nvsh]\|[0-1]\|[0-1]}", "0", note)
-                note = re.sub("{[1MFSVH]|[nvsh]\|1\|[0-1]}", "0", note)
-                note = re.sub("{[1SVHL]|[nvsh]\|0\|[0-1]}", "1", note)
-                note = re.sub("{2|[nvsh]\|0\|[0-1]}", "2", note)
-                note = re.sub("{3|[nvsh]\|0\|[0-1]}", "3", note)
-                note = note.replace("L", "1")
-                note = note.replace("6", "2")
-
-                note = note[:panels]
-                # Set a flag if a note doesn't match the pattern.
-                if not re.match(note_pat, note):
-                    self.standard = False
-                    break
-
-                clean_notes.append(note)
-        notes = "\n".join(clean_notes)
+        # Set a flag if a note doesn't match the pattern.
+        measures = self.scan_notes(notes)["measures"]
+        if measures is None:
+            self.standard = False
 
         # If the chart contains unusual notes, return an empty list.
         if not self.standard:
@@ -218,16 +299,14 @@ class Stepchart:
         # Loop through measures and parse notes.
         steps = []
         beat = 0
-        measures = notes.split(",")
         for measure in measures:
-            measure = measure.strip()
             parsed_measure = self.parse_measure(measure, beat)
             steps.extend(parsed_measure)
             beat += 4
 
         return steps
 
-    def parse_measure(self, measure: str, beat: int) -> list[list]:
+    def parse_measure(self, measure: list[str], beat: int) -> list[list]:
         """
         Parses the measure occuring at a specific beat.
 
@@ -239,7 +318,7 @@ class Stepchart:
 
         Arguments
         ---------
-        measure : str
+        measure : list[str]
             Lines representing all steps within a measure.
         beat : int
             The beat at which the measure begins.
@@ -249,11 +328,10 @@ class Stepchart:
         parsed_measure : list[list]
             A 2D list containing the parsed steps within the measure.
         """
-        notes = measure.split("\n")
-        num_notes = len(notes)
+        num_notes = len(measure)
         parsed_measure = []
 
-        for note in notes:
+        for note in measure:
             # Convert a half-doubles note to a doubles note.
             if self.convert_half_doubles and self.stepstype == "pump-halfdouble":
                 note = f"00{note}00"
@@ -293,6 +371,88 @@ class Stepchart:
 
         return parsed_step
 
+    def parse_steps_array(self, notes: str) -> np.ndarray:
+        """
+        Parse the note data in the stepchart into a structured array.
+
+        This produces the same steps as parse_steps, in the same order,
+        without creating a Python object per step. The note lines of
+        all measures are decoded at once as an array of characters.
+        Panels and step types are stored as indices into panel_map and
+        step_type_map. Beats are accumulated exactly as in
+        parse_measure, and ticks give the position of each step as an
+        integer, with 48 ticks per beat.
+
+        Arguments
+        ---------
+        notes : str
+            A stepchart section from an .ssc file.
+
+        Returns
+        -------
+        steps : np.ndarray
+            An array with dtype step_dtype containing all parsed steps
+            in the stepchart.
+        """
+        # Only consider pump single or double charts.
+        if self.panels == 0:
+            return np.empty(0, dtype=Stepchart.step_dtype)
+
+        # Set a flag if a note doesn't match the pattern.
+        measures = self.scan_notes(notes)["measures"]
+        if measures is None:
+            self.standard = False
+
+        # If the chart contains unusual notes, return an empty array.
+        if not self.standard:
+            return np.empty(0, dtype=Stepchart.step_dtype)
+
+        # Get the position of each line within the chart.
+        counts = np.array([len(measure) for measure in measures])
+        line_starts = np.cumsum(counts) - counts
+
+        # Decode all lines into an array with a column for each panel.
+        # Half-doubles lines are shifted onto the doubles panels.
+        width = Stepchart.note_widths[self.stepstype]
+        offset = 0
+        if self.convert_half_doubles and self.stepstype == "pump-halfdouble":
+            offset = 2
+        lines = "".join([note for measure in measures for note in measure])
+        if len(lines) != width * counts.sum():
+            lines = [note.ljust(width, "0") for measure in measures for note in measure]
+            lines = "".join(lines)
+        grid = np.frombuffer(lines.encode("ascii"), dtype=np.uint8)
+        grid = grid.reshape(-1, width)
+        line_idx, panel_idx = np.nonzero(grid != ord("0"))
+
+        # Map each character to its step type.
+        chars = grid[line_idx, panel_idx]
+        step_idx = Stepchart.step_codes[chars]
+        if (step_idx < 0).any():
+            raise KeyError(chr(chars[np.argmax(step_idx < 0)]))
+
+        # Accumulate the beat of each line within its measure, grouping
+        # measures with equal numbers of lines.
+        line_beats = np.empty(len(grid))
+        line_ticks = np.empty(len(grid), dtype=np.int64)
+        for num_notes in np.unique(counts):
+            sel = np.flatnonzero(counts == num_notes)
+            idx = line_starts[sel, None] + np.arange(num_notes)
+            increments = np.full(idx.shape, 4 / num_notes)
+            increments[:, 0] = 4 * sel
+            line_beats[idx] = np.cumsum(increments, axis=1)
+            ticks = Stepchart.ticks_per_measure * np.arange(num_notes) + num_notes // 2
+            ticks //= num_notes
+            line_ticks[idx] = Stepchart.ticks_per_measure * sel[:, None] + ticks
+
+        steps = np.empty(len(line_idx), dtype=Stepchart.step_dtype)
+        steps["panel"] = panel_idx + offset
+        steps["step_type"] = step_idx
+        steps["beat"] = line_beats[line_idx]
+        steps["tick"] = line_ticks[line_idx]
+
+        return steps
+
     def parse_timing_changes(self, key: str, timing_data: str) -> list[list]:
         """
         Parses timing changes found in the stepchart header attributes.
@@ -389,75 +549,42 @@ class Stepchart:
         steps_df : pd.DataFrame
             Records all steps in the stepchart.
         """
-        parsed_stepchart = self.parse_steps(self.notes)
+        steps = self.parse_steps_array(self.notes)
         steps_cols = ["panel", "step_type", "beat"]
-        steps_df = pd.DataFrame(columns=steps_cols, data=parsed_stepchart)
+        if len(steps) == 0:
+            return pd.DataFrame(columns=steps_cols, data=[])
+
+        panels = np.array(Stepchart.panel_map, dtype=object)
+        step_types = np.array(list(Stepchart.step_type_map.values()), dtype=object)
+        steps_df = pd.DataFrame(
+            {
+                "panel": panels[steps["panel"]],
+                "step_type": step_types[steps["step_type"]],
+                "beat": steps["beat"],
+            }
+        )
+
+        # Beats of steps at the start of a measure are integers, so the
+        # column is an integer column if every step starts a measure.
+        if not (steps["tick"] % Stepchart.ticks_per_measure).any():
+            steps_df["beat"] = steps_df["beat"].astype(int)
 
         return steps_df
 
-    def chart_to_df(self) -> pd.DataFrame:
+    def build_chart(self) -> tuple[np.ndarray, dict[str, np.ndarray]]:
         """
-        Returns a data frame storing all step and timing changes.
-
-        This function combines the data frames produced by the timing
-        change and step data frames produced by the steps_to_df and
-        timing_changes_to_df methods into a single data frame
-        describing the stepchart. The rows correspond to "events"
-        (notes/timing changes) within the stepchart and the columns
-        describe each event as well as the beat and second at whcih it
-        occurs.
+        Combine the steps and timing changes of the stepchart into
+        columns of arrays.
 
         Returns
         -------
-        chart_df : pd.DataFrame
-            A DataFrame containing all stepchart information, including
-            the timing and panels of all tap and hold notes, BPM
-            changes, and scroll rate effects.
+        index : np.ndarray
+            The row labels of the chart.
+        columns : dict[str, np.ndarray]
+            A dictionary mapping the column names of chart_to_df to
+            arrays of values.
         """
-        # Merge the step and timing data.
-        steps_df = self.steps_to_df()
-        timing_df = self.timing_changes_to_df()
-        df = pd.merge(steps_df, timing_df, on="beat", how="outer")
-
-        # Get the rows and columns corresponding to tap notes.
-        tap_sel = df["step_type"] == "tap"
-        tap_df = df.loc[tap_sel, ["beat", "panel"]]
-
-        # Get the rows corresponding to hold notes.
-        hold_caps = df["step_type"] == "hold (cap)"
-        hold_tails = df["step_type"] == "hold (tail)"
-        hold_sel = (hold_caps) | (hold_tails)
-        hold_cols = ["panel", "step_type", "beat"]
-        sort_cols = ["panel", "beat", "step_type"]
-        hold_df = df.loc[hold_sel, hold_cols].sort_values(sort_cols)
-
-        # Fix any holds that are warped over.
-        warps = df.loc[df["warp"] > 0, ["beat", "warp"]].copy()
-        warps["end"] = warps["beat"] + warps["warp"]
-        cap_warped = lambda x: warps.loc[
-            (warps["beat"] < x) & (warps["end"] > x), "end"
-        ].max()
-        sel = hold_df["step_type"] == "hold (cap)"
-        caps = hold_df.loc[sel, "beat"]
-        fixed_caps = caps.apply(cap_warped).fillna(caps)
-        hold_df.loc[sel, "beat"] = fixed_caps
-        tail_warped = lambda x: warps.loc[
-            (warps["beat"] < x) & (warps["end"] > x), "beat"
-        ].max()
-        sel = hold_df["step_type"] == "hold (tail)"
-        tails = hold_df.loc[sel, "beat"]
-        fixed_tails = tails.apply(tail_warped).fillna(tails)
-        hold_df.loc[sel, "beat"] = fixed_tails
-
-        # Get hold durations.
-        hold_df["duration"] = hold_df["beat"].diff(-1).abs()
-        cap_sel = hold_df["step_type"] == "hold (cap)"
-        tail_sel = hold_df["step_type"] == "hold (tail)"
-        hold_df.loc[tail_sel, "duration"] = 0
-
-        hold_df = hold_df.drop("step_type", axis=1)
-
-        # Represent the possible panels by a string.
+        # Only pump single and double panels are represented.
         if self.panels == 5:
             panels = "ZQSEC"
         elif self.panels == 10:
@@ -465,135 +592,38 @@ class Stepchart:
         else:
             panels = ""
 
-        # Dummify the panel columns.
-        for panel in panels:
-            panel_sel = tap_df["panel"] == panel
-            tap_df[f"tap_{panel}"] = panel_sel
-            panel_sel = hold_df["panel"] == panel
-            hold_df[f"hold_{panel}"] = panel_sel & cap_sel
-            hold_df[f"hold_duration_{panel}"] = panel_sel * hold_df["duration"]
-
-        # Drop artifact columns and merge rows with equal beats.
-        hold_df = hold_df.drop(["panel", "duration"], axis=1)
-        hold_df = hold_df.groupby("beat").sum().reset_index()
-        tap_df = tap_df.drop("panel", axis=1)
-        tap_df = tap_df.groupby("beat").sum().reset_index()
-
-        # Set hold durations to null when no hold is active.
-        for panel in panels:
-            panel_sel = df["panel"] == panel
-            cap_sel = df["step_type"] == "hold (cap)"
-            tail_sel = df["step_type"] == "hold (tail)"
-            sel = panel_sel & (cap_sel | tail_sel)
-            beats = df.loc[sel, "beat"]
-            inactive_beats = ~hold_df["beat"].isin(beats)
-            col = f"hold_duration_{panel}"
-            hold_df.loc[inactive_beats, col] = np.nan
-
-        # Get tickcount changes.
-        sel = df["tickcount"].notna()
-        tickcount_df = df.loc[sel, ["beat", "tickcount"]].copy()
-
-        # Get the columns corresponding to real time data.
-        timing_cols = ["beat", "bpm", "stop", "delay", "warp"]
-        sel = reduce(
-            lambda s1, s2: s1 | s2, (df[col].notna() for col in timing_cols[1:])
-        )
-        timing_df = df.loc[sel, timing_cols]
+        # Split the timing changes into a 2D array for each column.
+        timing_changes = dict()
+        for key, data in self.timing_data.items():
+            changes = np.array(self.parse_timing_changes(key, data), dtype=float)
+            for i, col in enumerate(Stepchart.timing_map[key][1:], start=1):
+                if len(changes):
+                    timing_changes[col] = changes[:, [0, i]]
 
-        # Get the columns corresponding to scroll rate changes.
-        scroll_cols = ["beat", "speed", "speed_duration", "speed_mode", "scroll_factor"]
-        sel = reduce(
-            lambda s1, s2: s1 | s2, (df[col].notna() for col in scroll_cols[1:])
-        )
-        scroll_df = df.loc[sel, scroll_cols]
-
-        # Merge the data frames and sort by beat.
-        data_frames = [tap_df, hold_df, tickcount_df, timing_df, scroll_df]
-        chart_df = (
-            reduce(
-                lambda df1, df2: pd.merge(df1, df2, how="outer", on="beat"), data_frames
-            )
-            .drop_duplicates()
-            .sort_values("beat")
-        )
+        steps = self.parse_steps_array(self.notes)
+        builder = ChartBuilder(steps, timing_changes, panels, self.timing)
+
+        return builder.build()
 
-        # Fill in hold durations.
-        cols = [f"hold_duration_{panel}" for panel in panels]
-        for col in cols:
-            tail_beat = (
-                chart_df[col]
-                .where(chart_df[col].isna(), chart_df["beat"] + chart_df[col])
-                .ffill()
-            )
-            duration = chart_df[col].fillna(tail_beat - chart_df["beat"])
-            chart_df[col] = duration
-            chart_df[col] = np.where(duration >= 0, duration, np.nan)
-
-        # Get rows and columns correspoding to warps.
-        warps = chart_df.loc[chart_df["warp"] > 0, ["beat", "warp"]].copy()
-        warps["end"] = warps["beat"] + warps["warp"]
-
-        # Ignore steps placed on top of warps.
-        step_cols = []
-        for panel in panels:
-            cols = [f"tap_{panel}", f"hold_{panel}"]
-            step_cols.extend(cols)
-        chart_df.loc[warps.index, step_cols] = 0
-
-        # Drop rows which are warped over.
-        warped = lambda x: ((x > warps["beat"]) & (x < warps["end"])).sum() > 0
-        warped_over = chart_df["beat"].apply(warped)
-        warped_over = chart_df.loc[warped_over, :]
-        chart_df = chart_df.drop(warped_over.index)
-
-        # Forward fill the 'bpm' column and 0-fill other columns.
-        chart_df["bpm"] = chart_df["bpm"].ffill()
-        cols = ["stop", "delay", "warp"]
-        chart_df.loc[:, cols] = chart_df.loc[:, cols].fillna(0)
-
-        # Get row-to-row changes in beats and combine with stop, delay,
-        # and warp numbers to get elapsed seconds for each row.
-        warp_sum = chart_df["warp"].cumsum().shift(1).fillna(0)
-        beats_corrected = chart_df["beat"] - warp_sum
-        beat_delta = beats_corrected.diff(-1).fillna(0).abs()
-        spb = 60 / chart_df["bpm"]  # Calculate seconds per beat.
-        time_shift = (chart_df["stop"] + chart_df["delay"]).cumsum()
-        time_shift -= self.offset
-        sec = (beat_delta * spb).cumsum() + time_shift
-        sec = sec.shift(1).fillna(0)
-        chart_df["sec"] = sec
-
-        # Forward fill the 'speed' and 'scroll factor' and create
-        # scroll rate column.
-        chart_df["speed"] = chart_df["speed"].ffill()
-        chart_df["scroll_factor"] = chart_df["scroll_factor"].ffill()
-        scroll_rate = chart_df["speed"] * chart_df["scroll_factor"]
-        chart_df["scroll_rate"] = scroll_rate
-
-        # Convert the type of dummy columns to int.
-        for panel in panels:
-            cols = [f"tap_{panel}", f"hold_{panel}"]
-            for col in cols:
-                chart_df[col] = chart_df[col].fillna(0).astype(int)
-
-        # Reorder the columns and reset the index.
-        cols_ordered = ["beat", "sec", "bpm"]
-        tap_cols = [f"tap_{panel}" for panel in panels]
-        hold_cols = [f"hold_{panel}" for panel in panels]
-        hold_duration_cols = [f"hold_duration_{panel}" for panel in panels]
-        cols_ordered.extend(tap_cols + hold_cols + hold_duration_cols)
-        cols_ordered.append("tickcount")
-        cols_ordered.extend(timing_cols[2:] + scroll_cols[1:])
-        chart_df = chart_df.loc[:, cols_ordered].reset_index(drop=True)
-
-        # Correct the initial time.
-        chart_df.loc[0, "sec"] = -self.offset
-
-        # Forward fill the 'tickcount' column.
-        chart_df["tickcount"] = chart_df["tickcount"].ffill()
-
-        # Delete duplicated timestamps.
-        chart_df = chart_df.drop_duplicates(subset="sec")
+    def chart_to_df(self) -> pd.DataFrame:
+        """
+        Returns a data frame storing all step and timing changes.
+
+        This function combines the steps and timing changes of the
+        stepchart into a single data frame describing the stepchart.
+        The rows correspond to "events" (notes/timing changes) within
+        the stepchart and the columns describe each event as well as
+        the beat and second at whcih it occurs. The columns are built by
+        build_chart.
+
+        Returns
+        -------
+        chart_df : pd.DataFrame
+            A DataFrame containing all stepchart information, including
+            the timing and panels of all tap and hold notes, BPM
+            changes, and scroll rate effects.
+        """
+        index, columns = self.build_chart()
+        chart_df = pd.DataFrame(columns, index=index)
 
         return chart_df
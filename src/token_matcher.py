@@ -0,0 +1,176 @@
+"""
+This module contains the TokenMatcher class, which can be used to find
+step patterns in arrays of step events without scanning text.
+"""
+
+import re
+import numpy as np
+from step_serializer import StepSerializer
+
+
+class TokenMatcher:
+    """
+    Find step patterns in the events of one or more stepcharts.
+
+    Each event, or token, of a serialized stepchart holds a timestamp
+    and the step string of a row. A step pattern matches a window of
+    consecutive tokens whose step strings match the notes of the
+    pattern. Matches are found as the regular expressions of the
+    StepPatternSearcher class find them: the step string of every note
+    but the last must match in full, the last need only begin with a
+    match, a note after the first cannot fall on a negative timestamp,
+    and overlapping matches are resolved from left to right.
+
+    Each note is only compared with the distinct step strings of the
+    charts, of which there are few, and windows are checked for all
+    tokens at once.
+    """
+
+    def __init__(self, events: np.ndarray, offsets: np.ndarray):
+        """
+        Initialize a TokenMatcher object for the events of stepcharts.
+
+        Arguments
+        ---------
+        events : np.ndarray
+            An array with dtype StepSerializer.event_dtype containing the
+            events of all stepcharts back to back.
+        offsets : np.ndarray
+            An array containing the index of the first event of each
+            stepchart followed by the total number of events.
+        """
+        self.serializer = StepSerializer()
+        self.note_tables = dict()
+
+        # Get the step string of each distinct row of steps.
+        keys = (events["taps"] & 0x3FF).astype(np.int64)
+        for shift, field in enumerate(StepSerializer.event_dtype.names[2:], start=1):
+            keys |= events[field].astype(np.int64) << (10 * shift)
+        keys, self.inverse = np.unique(keys, return_inverse=True)
+        self.strings = self.serializer.key_strings("D", keys)
+
+        # Timestamps written with a minus sign, including -0.0.
+        flagged = (events["taps"] & StepSerializer.negative_zero) > 0
+        self.negative = (events["ms"] < 0) | flagged
+
+        # Get the index after the last token of each token's chart.
+        offsets = np.asarray(offsets, dtype=np.int64)
+        self.chart_ends = np.repeat(offsets[1:], np.diff(offsets))
+
+    def note_table(self, note_pattern: str, last: bool) -> np.ndarray:
+        """
+        Check which distinct step strings match a note of a step
+        pattern.
+
+        Arguments
+        ---------
+        note_pattern : str
+            A regular expression for the step string of the note.
+        last : bool
+            If true, the note is the last of its pattern and only needs
+            to match the beginning of a step string.
+
+        Returns
+        -------
+        table : np.ndarray
+            A boolean array which is true for the step strings in
+            self.strings matching the note.
+        """
+        key = (note_pattern, last)
+        if key not in self.note_tables:
+            regex = re.compile(note_pattern)
+            match = regex.match if last else regex.fullmatch
+            table = np.array([match(s) is not None for s in self.strings], dtype=bool)
+            self.note_tables[key] = table
+
+        return self.note_tables[key]
+
+    def note_matches(self, note_pattern: str, last: bool) -> np.ndarray:
+        """
+        Check which tokens match a note of a step pattern.
+
+        Arguments
+        ---------
+        note_pattern : str
+            A regular expression for the step string of the note.
+        last : bool
+            If true, the note is the last of its pattern and only needs
+            to match the beginning of a step string.
+
+        Returns
+        -------
+        matches : np.ndarray
+            A boolean array which is true for tokens matching the note.
+        """
+        return self.note_table(note_pattern, last)[self.inverse]
+
+    def match(self, note_patterns: list[str]) -> np.ndarray:
+        """
+        Find the matches of a step pattern.
+
+        Arguments
+        ---------
+        note_patterns : list[str]
+            A regular expression for the step string of each note of
+            the pattern, as produced by
+            StepPatternSearcher.get_note_patterns.
+
+        Returns
+        -------
+        starts : np.ndarray
+            The index of the first token of each match, in increasing
+            order.
+        """
+        num_notes = len(note_patterns)
+        num_windows = max(len(self.inverse) - num_notes + 1, 0)
+
+        # Check each window of consecutive tokens note by note.
+        windows = self.chart_ends[:num_windows] >= np.arange(num_windows) + num_notes
+        for i, note_pattern in enumerate(note_patterns):
+            matches = self.note_matches(note_pattern, i == num_notes - 1)
+            if i > 0:
+                matches = matches & ~self.negative
+            windows &= matches[i : i + num_windows]
+        starts = np.flatnonzero(windows)
+
+        return TokenMatcher.non_overlapping(starts, num_notes)
+
+    @staticmethod
+    def non_overlapping(starts: np.ndarray, length: int | np.ndarray) -> np.ndarray:
+        """
+        Select matches from left to right, skipping any match which
+        overlaps a selected match.
+
+        Matches beginning after the end of every previous match start a
+        cluster and are always selected. Within clusters, the next
+        selected match is found for all clusters at once.
+
+        Arguments
+        ---------
+        starts : np.ndarray
+            The first token of each match, in increasing order.
+        length : int | np.ndarray
+            The number of tokens in each match, either the same for all
+            matches or given for each match.
+
+        Returns
+        -------
+        starts : np.ndarray
+            The first token of each selected match.
+        """
+        if len(starts) == 0 or np.max(length) <= 1:
+            return starts
+
+        ends = starts + length
+        following = np.searchsorted(starts, ends)
+        first = np.ones(len(starts), dtype=bool)
+        first[1:] = starts[1:] >= np.maximum.accumulate(ends)[:-1]
+        selected = np.zeros(len(starts), dtype=bool)
+        current = np.flatnonzero(first)
+        while len(current) > 0:
+            selected[current] = True
+            current = following[current]
+            current = current[current < len(starts)]
+            current = current[~first[current]]
+
+        return starts[selected]